@@ -7,35 +7,58 @@ import yaml
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from src.profiling import profile_section
+from src.tool_index import ToolIndex
+
+def create_template_environment(templates_path='templates', auto_reload=True):
+    """Create the Jinja2 environment used to render agent prompts"""
+    return Environment(
+        loader=FileSystemLoader(templates_path),
+        trim_blocks=True,
+        lstrip_blocks=True,
+        auto_reload=auto_reload
+    )
 
 class HayashiAgent:
-    def __init__(self):
-        # Load environment variables
-        load_dotenv()
-        
-        # Initialize Jinja2 environment
-        self.env = Environment(
-            loader=FileSystemLoader('templates'),
-            trim_blocks=True,
-            lstrip_blocks=True
-        )
-        
-        # Load configuration
-        self.config = self._load_config()
+    def __init__(
+        self,
+        config_path='config/hayashi_agent_config.yaml',
+        templates_path='templates',
+        env=None,
+        profile=None
+    ):
+        """
+        Initialize the agent
         
-        # Set up environment variables
-        self.environment = {
-            'type': os.getenv('ENVIRONMENT_TYPE', 'development'),
-            'language': os.getenv('LANGUAGE', 'Japanese'),
-            'security_level': os.getenv('SECURITY_LEVEL', 'high'),
-            'CWD': os.getcwd(),
-            'SHELL': os.environ.get('SHELL', ''),
-            'OS': os.uname().sysname
-        }
+        env can be a shared Jinja2 environment so compiled templates are reused across agents.
+        profile=True forces profiling, None follows HAYASHI_PROFILE.
+        """
+        with profile_section("app.HayashiAgent.__init__", enabled=profile):
+            # Load environment variables
+            load_dotenv()
+            
+            # Initialize Jinja2 environment
+            self.env = env or create_template_environment(templates_path)
+            
+            # Load configuration
+            self.config = self._load_config(config_path)
+            
+            # Build the tool relevance index once at load
+            self.tool_index = ToolIndex(self.config['tools'])
+            
+            # Set up environment variables
+            self.environment = {
+                'type': os.getenv('ENVIRONMENT_TYPE', 'development'),
+                'language': os.getenv('LANGUAGE', 'Japanese'),
+                'security_level': os.getenv('SECURITY_LEVEL', 'high'),
+                'CWD': os.getcwd(),
+                'SHELL': os.environ.get('SHELL', ''),
+                'OS': os.uname().sysname
+            }
 
-    def _load_config(self):
+    def _load_config(self, config_path='config/hayashi_agent_config.yaml'):
         """Load configuration from YAML file"""
-        config_path = Path('config/hayashi_agent_config.yaml')
+        config_path = Path(config_path)
         if not config_path.exists():
             raise FileNotFoundError("Configuration file not found")
             
@@ -52,25 +75,35 @@ class HayashiAgent:
             
         return config
 
-    def render_prompt(self, mode='architect'):
-        """Render the prompt template for specified mode"""
-        template = self.env.get_template('hayashi_agent.j2')
-        
-        # Prepare template variables
-        template_vars = {
-            'environment': self.environment,
-            'operational_modes': self.config['operational_modes'],
-            'tools': self.config['tools'],
-            'tool_guidelines': self.config.get('tool_guidelines', []),
-            'error_handling': self.config['error_handling'],
-            'validation_rules': self.config['validation_rules'],
-            'security_boundaries': self.config['security_boundaries'],
-            'modes': [m for m in self.config['operational_modes'] if m['name'] == mode],
-            'agent_name': "Hayashi Agent",
-            'agent_version': self.config['version']
-        }
-        
-        return template.render(**template_vars)
+    def select_tools(self, query=None):
+        """Select the top-k tools relevant to query plus pinned ones (all tools when query is empty)"""
+        selection = self.config.get('tool_selection', {})
+        return self.tool_index.select(
+            query,
+            top_k=selection.get('top_k', 10),
+            pinned=selection.get('pinned', [])
+        )
+
+    def render_prompt(self, mode='architect', query=None, profile=None):
+        """Render the prompt template for specified mode (query narrows the tool list, profile=True forces profiling)"""
+        with profile_section("app.render_prompt", enabled=profile):
+            template = self.env.get_template('hayashi_agent.j2')
+            
+            # Prepare template variables
+            template_vars = {
+                'environment': self.environment,
+                'operational_modes': self.config['operational_modes'],
+                'tools': self.select_tools(query),
+                'tool_guidelines': self.config.get('tool_guidelines', []),
+                'error_handling': self.config['error_handling'],
+                'validation_rules': self.config['validation_rules'],
+                'security_boundaries': self.config['security_boundaries'],
+                'modes': [m for m in self.config['operational_modes'] if m['name'] == mode],
+                'agent_name': "Hayashi Agent",
+                'agent_version': self.config['version']
+            }
+            
+            return template.render(**template_vars)
 
 def main():
     try:
@@ -0,0 +1,437 @@
+"""
+Hayashi Agent Prompt Generator - Load Test Harness
+
+Simulates N concurrent users in one process, the way the Streamlit container serves
+sessions from threads, and drives the same code paths the apps use:
+
+- generate: PromptChainBuilder.generate_prompt with one builder per user session
+  (like src/app.py), backed by a local fake LLM with log-normal latency
+- render: HayashiAgent().render_prompt for a random mode and query, building the agent
+  on every request like streamlit_app.py does on every rerun
+
+Users are added according to a ramp-up profile and keep issuing requests until the run
+ends. The report contains throughput, p50/p95/p99 latency per operation and per
+concurrency level, RSS growth and thread/socket counts. Runs are seeded and the JSON
+output has a fixed layout, so two runs can be compared with --compare.
+
+Ramp-up profiles:
+    constant   all users start immediately
+    linear     users are added evenly over --ramp seconds
+    step       users are added in --steps equal batches over --ramp seconds
+
+Usage:
+    python load_test.py --users 50 --profile linear --ramp 30 --duration 90 --output run.json
+    python load_test.py --users 50 --profile linear --ramp 30 --duration 90 --compare run.json
+"""
+
+from collections import defaultdict
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+
+# src/ modules import each other by flat name; appended so the root app.py wins over src/app.py
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src')
+if SRC_PATH not in sys.path:
+    sys.path.append(SRC_PATH)
+
+from model_router import percentile
+
+PROFILES = ('constant', 'linear', 'step')
+SCENARIOS = {
+    'generate': {'generate': 1.0},
+    'render': {'render': 1.0},
+    'mixed': {'generate': 0.2, 'render': 0.8}
+}
+SAMPLE_INPUTS = [
+    "プロジェクト管理と開発支援を行うAIエージェントが必要です。",
+    "コードレビューを支援するエージェント",
+    "顧客からの問い合わせに回答するサポートエージェント",
+    "データ分析とレポート作成を自動化するエージェント",
+    "セキュリティ診断を行うエージェント"
+]
+SAMPLE_QUERIES = [None, "ファイル 読み込み", "コマンド 実行", "検索", "差分 適用"]
+
+def target_users(profile, elapsed, users, ramp, steps=5):
+    """Number of users that should be active `elapsed` seconds into the run"""
+    if profile == 'constant' or ramp <= 0 or elapsed >= ramp:
+        return users
+    if profile == 'linear':
+        return max(1, math.ceil(users * elapsed / ramp))
+    if profile == 'step':
+        step = math.floor(elapsed / (ramp / steps)) + 1
+        return max(1, min(users, math.ceil(users * step / steps)))
+    raise ValueError(f"Unknown ramp-up profile: {profile}")
+
+def process_stats():
+    """RSS (MB), Python thread count and open socket count of this process"""
+    stats = {'rss_mb': None, 'threads': threading.active_count(), 'connections': None}
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    stats['rss_mb'] = round(int(line.split()[1]) / 1024, 1)
+                    break
+    except OSError:
+        import resource
+        # Peak RSS only; reported in KB on Linux and bytes on macOS
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        stats['rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+    try:
+        sockets = 0
+        for fd in os.listdir('/proc/self/fd'):
+            try:
+                if os.readlink(f'/proc/self/fd/{fd}').startswith('socket:'):
+                    sockets += 1
+            except OSError:
+                continue
+        stats['connections'] = sockets
+    except OSError:
+        pass
+    return stats
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class Session:
+    """Per-user state, mirroring one Streamlit session"""
+
+    def __init__(self, user_id, args):
+        self.rng = random.Random(args.seed * 1000 + user_id)
+        self._args = args
+        self._builder = None
+        self._user_id = user_id
+
+    @property
+    def builder(self):
+        if self._builder is None:
+            from fake_llm import FakeChatModel, lognormal_latency
+            from prompt_chain import PromptChainBuilder
+            args = self._args
+            latency = lognormal_latency(args.llm_latency, args.llm_sigma, seed=args.seed * 1000 + self._user_id)
+            self._builder = PromptChainBuilder(
+                model_factory=lambda model_name, config: FakeChatModel(
+                    model_name=model_name,
+                    latency=latency,
+                    error_rate=args.llm_error_rate,
+                    seed=self.rng.randrange(2 ** 32)
+                )
+            )
+        return self._builder
+
+    def generate(self):
+        self.builder.generate_prompt(self.rng.choice(SAMPLE_INPUTS), stream=self._args.stream)
+
+    def render(self):
+        from app import HayashiAgent
+        agent = HayashiAgent()
+        mode = self.rng.choice([m['name'] for m in agent.config['operational_modes']])
+        agent.render_prompt(mode=mode, query=self.rng.choice(SAMPLE_QUERIES))
+
+def preload(scenario):
+    """Import the code under test up front so RSS growth excludes one-off import cost"""
+    operations = SCENARIOS[scenario]
+    if 'generate' in operations:
+        import fake_llm
+        import prompt_chain
+    if 'render' in operations:
+        import app
+
+class LoadTest:
+    """Runs one load test and collects request records and process samples"""
+
+    def __init__(self, args):
+        self.args = args
+        self.weights = SCENARIOS[args.scenario]
+        self.records = []
+        self.samples = []
+        self.active_users = 0
+        self.time_at_users = defaultdict(float)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._started = None
+
+    def _user_loop(self, user_id):
+        session = Session(user_id, self.args)
+        operations = list(self.weights)
+        weights = [self.weights[name] for name in operations]
+        while not self._stop.is_set():
+            operation = session.rng.choices(operations, weights)[0]
+            users = self.active_users
+            started = time.perf_counter()
+            error = None
+            try:
+                getattr(session, operation)()
+            except Exception as e:
+                error = type(e).__name__
+            finished = time.perf_counter()
+            if self._stop.is_set():
+                break
+            with self._lock:
+                self.records.append({
+                    'operation': operation,
+                    'start': started - self._started,
+                    'end': finished - self._started,
+                    'latency': finished - started,
+                    'users': users,
+                    'users_at_end': self.active_users,
+                    'error': error
+                })
+            if self.args.think_time > 0:
+                self._stop.wait(session.rng.expovariate(1.0 / self.args.think_time))
+
+    def run(self):
+        args = self.args
+        preload(args.scenario)
+        baseline = process_stats()
+        threads = []
+        self._started = time.perf_counter()
+        next_sample = 0.0
+        previous = 0.0
+        while True:
+            elapsed = time.perf_counter() - self._started
+            self.time_at_users[self.active_users] += elapsed - previous
+            previous = elapsed
+            if elapsed >= args.duration:
+                break
+            target = target_users(args.profile, elapsed, args.users, args.ramp, args.steps)
+            while len(threads) < target:
+                thread = threading.Thread(
+                    target=self._user_loop,
+                    args=(len(threads),),
+                    name=f"load-user-{len(threads)}",
+                    daemon=True
+                )
+                threads.append(thread)
+                self.active_users = len(threads)
+                thread.start()
+            if elapsed >= next_sample:
+                with self._lock:
+                    completed = len(self.records)
+                self.samples.append({
+                    't': round(elapsed, 2),
+                    'users': self.active_users,
+                    'completed': completed,
+                    **process_stats()
+                })
+                next_sample += args.sample_interval
+            time.sleep(0.05)
+        self._stop.set()
+        final = process_stats()
+        self.samples.append({
+            't': round(time.perf_counter() - self._started, 2),
+            'users': self.active_users,
+            'completed': len(self.records),
+            **final
+        })
+        for thread in threads:
+            thread.join(timeout=args.drain_timeout)
+        return build_report(args, self.records, self.samples, self.time_at_users, baseline)
+
+def latency_summary(records, duration):
+    latencies = [record['latency'] for record in records if record['error'] is None]
+    errors = sum(1 for record in records if record['error'] is not None)
+    return {
+        'count': len(records),
+        'errors': errors,
+        'error_rate': round(errors / len(records), 4) if records else 0.0,
+        'throughput': round(len(latencies) / duration, 3) if duration > 0 else 0.0,
+        'p50': round(percentile(latencies, 50), 4),
+        'p95': round(percentile(latencies, 95), 4),
+        'p99': round(percentile(latencies, 99), 4),
+        'max': round(max(latencies), 4) if latencies else 0.0
+    }
+
+def concurrency_levels(args, records, time_at_users):
+    """
+    Latency and throughput grouped into at most 10 concurrency levels
+
+    Latency is grouped by the number of active users when the request started. Throughput
+    is the number of requests that completed at a level divided by the time the run spent
+    there (None for levels the ramp passed through without measurable time).
+    """
+    width = max(1, math.ceil(args.users / 10))
+    level_of = lambda users: min(args.users, math.ceil(users / width) * width)
+    by_start = defaultdict(list)
+    completed_at = defaultdict(int)
+    for record in records:
+        by_start[level_of(record['users'])].append(record)
+        if record['error'] is None:
+            completed_at[level_of(record['users_at_end'])] += 1
+    time_at = defaultdict(float)
+    for users, seconds in time_at_users.items():
+        time_at[level_of(users)] += seconds
+    levels = []
+    for level in sorted(by_start):
+        summary = latency_summary(by_start[level], time_at[level])
+        summary['throughput'] = round(completed_at[level] / time_at[level], 3) if time_at[level] >= 0.05 else None
+        levels.append({'users': level, 'seconds': round(time_at[level], 2), **summary})
+    return levels
+
+def build_report(args, records, samples, time_at_users, baseline):
+    duration = samples[-1]['t'] if samples else args.duration
+    operations = {
+        name: latency_summary([record for record in records if record['operation'] == name], duration)
+        for name in sorted(SCENARIOS[args.scenario])
+    }
+    rss_values = [sample['rss_mb'] for sample in samples if sample['rss_mb'] is not None]
+    connections = [sample['connections'] for sample in samples if sample['connections'] is not None]
+    return {
+        'meta': {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'config': {key: value for key, value in sorted(vars(args).items()) if key not in ('output', 'compare')}
+        },
+        'summary': {
+            'duration': round(duration, 2),
+            **latency_summary(records, duration),
+            'operations': operations,
+            'rss_start_mb': baseline['rss_mb'],
+            'rss_end_mb': samples[-1]['rss_mb'] if samples else None,
+            'rss_peak_mb': max(rss_values) if rss_values else None,
+            'rss_growth_mb': (
+                round(samples[-1]['rss_mb'] - baseline['rss_mb'], 1)
+                if samples and baseline['rss_mb'] is not None and samples[-1]['rss_mb'] is not None else None
+            ),
+            'threads_start': baseline['threads'],
+            'threads_peak': max(sample['threads'] for sample in samples) if samples else None,
+            'connections_start': baseline['connections'],
+            'connections_peak': max(connections) if connections else None
+        },
+        'by_users': concurrency_levels(args, records, time_at_users),
+        'samples': samples
+    }
+
+def comparison_rows(report):
+    """Flatten the metrics worth comparing into (name, value, lower_is_better) rows"""
+    summary = report['summary']
+    rows = [
+        ('throughput', summary['throughput'], False),
+        ('error_rate', summary['error_rate'], True),
+        ('p50', summary['p50'], True),
+        ('p95', summary['p95'], True),
+        ('p99', summary['p99'], True)
+    ]
+    for name, operation in summary['operations'].items():
+        rows.extend([
+            (f'{name}.throughput', operation['throughput'], False),
+            (f'{name}.p50', operation['p50'], True),
+            (f'{name}.p95', operation['p95'], True),
+            (f'{name}.p99', operation['p99'], True)
+        ])
+    rows.extend([
+        ('rss_growth_mb', summary['rss_growth_mb'], True),
+        ('threads_peak', summary['threads_peak'], True),
+        ('connections_peak', summary['connections_peak'], True)
+    ])
+    return rows
+
+def compare_reports(current, baseline):
+    """Text table of current vs baseline metrics with relative change"""
+    lines = []
+    differing = sorted(
+        key for key in set(current['meta']['config']) | set(baseline['meta']['config'])
+        if current['meta']['config'].get(key) != baseline['meta']['config'].get(key)
+    )
+    if differing:
+        lines.append(f"⚠️ Config differs from baseline: {', '.join(differing)}")
+    lines.append(f"{'metric':<24}{'baseline':>12}{'current':>12}{'change':>10}")
+    previous = {name: value for name, value, _ in comparison_rows(baseline)}
+    for name, value, lower_is_better in comparison_rows(current):
+        base = previous.get(name)
+        if value is None or base is None:
+            change = ''
+        elif base == 0:
+            change = '' if value == 0 else 'new'
+        else:
+            delta = (value - base) / base * 100
+            worse = delta > 0 if lower_is_better else delta < 0
+            change = f"{delta:+.1f}%{' !' if worse and abs(delta) >= 10 else ''}"
+        lines.append(f"{name:<24}{_format(base):>12}{_format(value):>12}{change:>10}")
+    return '\n'.join(lines)
+
+def _format(value, spec='.4g'):
+    if value is None:
+        return '-'
+    return format(value, spec) if isinstance(value, float) else str(value)
+
+def format_report(report):
+    summary = report['summary']
+    lines = [
+        f"{summary['count']} requests in {summary['duration']:.1f}s "
+        f"({summary['throughput']:.2f} req/s, {summary['errors']} errors)",
+        f"RSS {_format(summary['rss_start_mb'])} → {_format(summary['rss_end_mb'])} MB "
+        f"(peak {_format(summary['rss_peak_mb'])} MB), threads peak {summary['threads_peak']}, "
+        f"sockets peak {_format(summary['connections_peak'])}",
+        '',
+        f"{'operation':<12}{'count':>8}{'req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'errors':>8}"
+    ]
+    for name, operation in summary['operations'].items():
+        lines.append(
+            f"{name:<12}{operation['count']:>8}{operation['throughput']:>10.2f}"
+            f"{operation['p50']:>10.3f}{operation['p95']:>10.3f}{operation['p99']:>10.3f}{operation['errors']:>8}"
+        )
+    lines.extend(['', f"{'users':<12}{'count':>8}{'req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'errors':>8}"])
+    for level in report['by_users']:
+        lines.append(
+            f"{'≤' + str(level['users']):<12}{level['count']:>8}{_format(level['throughput'], '.2f'):>10}"
+            f"{level['p50']:>10.3f}{level['p95']:>10.3f}{level['p99']:>10.3f}{level['errors']:>8}"
+        )
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test prompt generation and rendering with simulated users")
+    parser.add_argument('--users', type=int, default=20, help="Number of simulated concurrent users")
+    parser.add_argument('--profile', choices=PROFILES, default='linear', help="Ramp-up profile")
+    parser.add_argument('--ramp', type=float, default=30.0, help="Seconds until all users are active")
+    parser.add_argument('--steps', type=int, default=5, help="Number of batches for the step profile")
+    parser.add_argument('--duration', type=float, default=60.0, help="Total run time in seconds")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed', help="Operations each user issues")
+    parser.add_argument('--think-time', type=float, default=1.0, help="Mean pause between a user's requests (seconds)")
+    parser.add_argument('--llm-latency', type=float, default=1.0, help="Median fake LLM latency per stage (seconds)")
+    parser.add_argument('--llm-sigma', type=float, default=0.5, help="Log-normal sigma of the fake LLM latency")
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help="Fraction of fake LLM calls that fail")
+    parser.add_argument('--stream', action='store_true', help="Use streaming role analysis in generate_prompt")
+    parser.add_argument('--sample-interval', type=float, default=1.0, help="Seconds between process samples")
+    parser.add_argument('--drain-timeout', type=float, default=10.0, help="Seconds to wait for in-flight requests")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('--output', help="Write the JSON report to this file")
+    parser.add_argument('--compare', help="Compare against a previous JSON report")
+    args = parser.parse_args()
+
+    try:
+        report = LoadTest(args).run()
+        print(format_report(report))
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"\n✅ Report written to {args.output}")
+        if args.compare:
+            with open(args.compare, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            print()
+            print(compare_reports(report, baseline))
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
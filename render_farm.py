@@ -0,0 +1,250 @@
+"""
+Hayashi Agent Prompt Generator - Bulk Render Farm
+
+Pre-renders prompts for every combination of config × operational mode × language ×
+security level × environment type in a process pool.
+
+- Each worker compiles the templates once and reuses one agent per config file
+- Outputs are written to sharded directories (<output>/<shard>/<job_id>.md)
+- manifest.json records the input hash and content hash of every output, and jobs whose
+  inputs (templates, config file, parameters, host environment) are unchanged are skipped
+
+Matrix file example (YAML):
+    configs:
+      - config/hayashi_agent_config.yaml
+    modes: [architect, ask, code]       # omit to render every mode defined in each config
+    languages: [Japanese, English]
+    security_levels: [high, medium]
+    environment_types: [development, production]
+
+Usage:
+    python render_farm.py --matrix matrix.yaml --output rendered --workers 4
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import re
+import time
+import yaml
+
+MANIFEST_NAME = 'manifest.json'
+
+# Per-worker state: one shared template environment and one agent per config file
+_worker_env = None
+_worker_agents = {}
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+def hash_templates(templates_path):
+    """Hash every template file so any template edit invalidates all outputs"""
+    digest = hashlib.sha256()
+    for path in sorted(Path(templates_path).rglob('*')):
+        if path.is_file():
+            digest.update(str(path.relative_to(templates_path)).encode('utf-8'))
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+def host_environment():
+    """Host-dependent values HayashiAgent puts into the prompt"""
+    return {
+        'CWD': os.getcwd(),
+        'SHELL': os.environ.get('SHELL', ''),
+        'OS': os.uname().sysname
+    }
+
+def _slug(value):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(value)).strip('_') or 'x'
+
+def job_id_for(job):
+    """
+    Unique, filesystem-safe id of a job
+
+    The readable prefix is an ASCII slug of the parameters, which can collide
+    (non-ASCII values, configs with the same file name in different directories),
+    so it is followed by a short hash of the full job parameters.
+    """
+    prefix = '-'.join(_slug(part) for part in (
+        Path(job['config_path']).stem, job['mode'], job['language'],
+        job['security_level'], job['environment_type']
+    ))
+    digest = _sha256(json.dumps(job, sort_keys=True, ensure_ascii=False).encode('utf-8'))[:12]
+    return f"{prefix}-{digest}"
+
+def expand_matrix(matrix):
+    """Expand the parameter matrix into a list of render jobs"""
+    jobs = []
+    for config_path in matrix.get('configs', ['config/hayashi_agent_config.yaml']):
+        modes = matrix.get('modes')
+        if not modes:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                modes = [mode['name'] for mode in yaml.safe_load(f)['operational_modes']]
+        for mode, language, security_level, environment_type in itertools.product(
+            modes,
+            matrix.get('languages', ['Japanese']),
+            matrix.get('security_levels', ['high']),
+            matrix.get('environment_types', ['development'])
+        ):
+            job = {
+                'config_path': config_path,
+                'mode': mode,
+                'language': language,
+                'security_level': security_level,
+                'environment_type': environment_type
+            }
+            jobs.append({'job_id': job_id_for(job), **job})
+    return jobs
+
+def job_input_hash(job, templates_hash, config_hashes, host_env):
+    """Hash of everything that determines a job's output"""
+    payload = {
+        'job': job,
+        'templates': templates_hash,
+        'config': config_hashes[job['config_path']],
+        'host': host_env
+    }
+    return _sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+
+def shard_path(output_dir, job_id):
+    """Output path of a job, sharded by the first two hex digits of its id hash"""
+    shard = _sha256(job_id.encode('utf-8'))[:2]
+    return os.path.join(output_dir, shard, f"{job_id}.md")
+
+def _init_worker(templates_path):
+    """Compile templates once per worker process"""
+    global _worker_env
+    from app import create_template_environment
+    _worker_env = create_template_environment(templates_path, auto_reload=False)
+    _worker_env.get_template('hayashi_agent.j2')
+
+def _render_job(args):
+    """Render one job inside a worker and write it to its shard"""
+    job, output_dir, input_hash = args
+    from app import HayashiAgent
+    agent = _worker_agents.get(job['config_path'])
+    if agent is None:
+        agent = _worker_agents[job['config_path']] = HayashiAgent(
+            config_path=job['config_path'],
+            env=_worker_env
+        )
+    agent.environment = {
+        **agent.environment,
+        'type': job['environment_type'],
+        'language': job['language'],
+        'security_level': job['security_level']
+    }
+    content = agent.render_prompt(mode=job['mode']).encode('utf-8')
+
+    path = shard_path(output_dir, job['job_id'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+    return job['job_id'], path, _sha256(content), input_hash
+
+def load_manifest(output_dir):
+    """Load the manifest from a previous run (empty when missing or unreadable)"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'entries': {}}
+
+def write_manifest(output_dir, manifest):
+    """Write the manifest atomically"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+def render_matrix(matrix, output_dir, templates_path='templates', workers=None, force=False):
+    """
+    Render every job in the matrix, skipping jobs whose inputs are unchanged
+
+    Returns a summary dict with rendered/skipped counts and elapsed seconds.
+    """
+    started = time.perf_counter()
+    jobs = expand_matrix(matrix)
+    templates_hash = hash_templates(templates_path)
+    config_hashes = {}
+    for job in jobs:
+        if job['config_path'] not in config_hashes:
+            config_hashes[job['config_path']] = _sha256(Path(job['config_path']).read_bytes())
+    host_env = host_environment()
+
+    previous = load_manifest(output_dir).get('entries', {})
+    entries = {}
+    pending = []
+    for job in jobs:
+        input_hash = job_input_hash(job, templates_hash, config_hashes, host_env)
+        entry = previous.get(job['job_id'])
+        if (not force and entry and entry.get('input_hash') == input_hash
+                and os.path.exists(os.path.join(output_dir, entry['path']))):
+            entries[job['job_id']] = entry
+        else:
+            pending.append((job, output_dir, input_hash))
+
+    if pending:
+        os.makedirs(output_dir, exist_ok=True)
+        jobs_by_id = {job['job_id']: job for job in jobs}
+        chunksize = max(1, len(pending) // ((workers or os.cpu_count() or 1) * 4))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(templates_path,)
+        ) as executor:
+            for job_id, path, content_hash, input_hash in executor.map(_render_job, pending, chunksize=chunksize):
+                job = jobs_by_id[job_id]
+                entries[job_id] = {
+                    **{key: value for key, value in job.items() if key != 'job_id'},
+                    'path': os.path.relpath(path, output_dir),
+                    'input_hash': input_hash,
+                    'content_hash': content_hash
+                }
+
+    write_manifest(output_dir, {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'templates_hash': templates_hash,
+        'entries': entries
+    })
+    return {
+        'total': len(jobs),
+        'rendered': len(pending),
+        'skipped': len(jobs) - len(pending),
+        'elapsed': time.perf_counter() - started
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-render Hayashi Agent prompts for a parameter matrix")
+    parser.add_argument('--matrix', help="YAML file describing the parameter matrix")
+    parser.add_argument('--output', default='rendered', help="Output directory")
+    parser.add_argument('--templates', default='templates', help="Template directory")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes")
+    parser.add_argument('--force', action='store_true', help="Re-render even if inputs are unchanged")
+    args = parser.parse_args()
+
+    try:
+        matrix = {}
+        if args.matrix:
+            with open(args.matrix, 'r', encoding='utf-8') as f:
+                matrix = yaml.safe_load(f) or {}
+        summary = render_matrix(matrix, args.output, args.templates, args.workers, args.force)
+        print(
+            f"✅ {summary['rendered']} rendered, {summary['skipped']} skipped "
+            f"({summary['total']} total) in {summary['elapsed']:.2f}s"
+        )
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
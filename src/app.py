@@ -8,9 +8,11 @@ Hayashi Agent Prompt Generator - デモアプリケーション
 import streamlit as st
 from streamlit_ace import st_ace
 from prompt_chain import PromptChainBuilder
-from typing import Iterable
+from history_store import HistoryStore, owner_for
+from typing import Iterable, Optional
 import json
 import os
+import time
 from dotenv import load_dotenv
 
 # 環境変数の読み込み
@@ -30,6 +32,28 @@ def init_session_state():
         st.session_state.last_result = None
     if 'api_key' not in st.session_state:
         st.session_state.api_key = os.getenv("ANTHROPIC_API_KEY", "")
+    if 'history_owner' not in st.session_state:
+        st.session_state.history_owner = history_owner("")
+
+def history_owner(api_key: str) -> Optional[str]:
+    """
+    生成履歴の所有者を決定
+
+    公開環境で他の利用者の入力が見えないよう、既定ではサイドバーで入力したAPIキーの
+    ハッシュを所有者とします。同じキーを入力すれば再読み込みや別のセッションでも
+    同じ履歴が見えます。サーバーの環境変数から読み込んだキーは利用者を区別しないため
+    使いません。単独利用の環境では HAYASHI_HISTORY_SHARED=1 で全セッションの履歴を
+    共有できます。
+
+    Args:
+        api_key (str): サイドバーで入力したAPIキー（未入力の場合は空文字列）
+
+    Returns:
+        Optional[str]: 履歴の所有者（共有時は空文字列、利用者を識別できない場合はNone）
+    """
+    if os.getenv("HAYASHI_HISTORY_SHARED") == "1":
+        return ""
+    return owner_for(api_key) if api_key else None
 
 def initialize_builder():
     """PromptChainBuilderの初期化"""
@@ -52,9 +76,53 @@ def display_api_key_input():
         
         if api_key != st.session_state.api_key:
             st.session_state.api_key = api_key
+            st.session_state.history_owner = history_owner(api_key)
             st.session_state.builder = None
             st.experimental_rerun()
 
+@st.cache_resource
+def get_history_store() -> Optional[HistoryStore]:
+    """
+    生成履歴ストアの取得（プロセス内で共有）
+
+    環境変数 HAYASHI_HISTORY_DB が設定されている場合のみ有効です。
+    履歴は所有者（history_ownerで決定）ごとに分離して保存・検索します。
+
+    Returns:
+        Optional[HistoryStore]: 履歴ストア（無効の場合はNone）
+    """
+    db_path = os.getenv("HAYASHI_HISTORY_DB")
+    return HistoryStore(db_path) if db_path else None
+
+def display_history_search():
+    """生成履歴の検索パネルの表示"""
+    store = get_history_store()
+    if store is None:
+        return
+    owner = st.session_state.history_owner
+    with st.sidebar:
+        st.subheader("🕘 生成履歴")
+        if owner is None:
+            st.caption("API Keyを入力すると、そのキーごとに履歴が保存されます。")
+            return
+        query = st.text_input(
+            "履歴を検索",
+            key="history_query",
+            placeholder="入力内容・役割名・ツール・制約条件",
+            help="過去の生成結果を再利用すると、LLMを呼び出さずにすぐ表示できます"
+        )
+        entries = store.search(query, limit=10, owner=owner)
+        if not entries:
+            st.caption("該当する履歴はありません。")
+        for entry in entries:
+            created_at = time.strftime("%m/%d %H:%M", time.localtime(entry["created_at"]))
+            if st.button(
+                f"♻️ {entry['role_name']}（{created_at}）",
+                key=f"history_{entry['id']}",
+                help=entry["user_input"][:200]
+            ):
+                st.session_state.last_result = store.get(entry["id"], owner=owner)
+
 def display_agent_config(config):
     """エージェント設定の表示"""
     st.subheader("🔧 エージェント設定")
@@ -111,35 +179,8 @@ def check_api_key():
         return False
     return True
 
-def main():
-    """メイン関数"""
-    try:
-        st.set_page_config(
-            page_title="Hayashi Agent Prompt Generator",
-            page_icon="🤖",
-            layout="wide"
-        )
-    except Exception:
-        # ページ設定が既に行われている場合は無視
-        pass
-    
-    init_session_state()
-    display_api_key_input()
-    
-    st.title("🤖 Hayashi Agent Prompt Generator")
-    st.write("""
-    このデモでは、ユーザー入力からAIエージェントのプロンプトを動的に生成します。
-    必要な機能と制約を入力してください。
-    """)
-    
-    if not st.session_state.api_key:
-        st.warning("⚠️ API Keyを入力してください。")
-        return
-    
-    if st.session_state.builder is None and not initialize_builder():
-        st.error("⚠️ PromptChainBuilderの初期化に失敗しました。")
-        return
-    
+def display_generation_form():
+    """要件の入力フォームとプロンプトの生成"""
     # ユーザー入力
     user_input = st.text_area(
         "エージェントの要件を入力してください",
@@ -162,12 +203,15 @@ def main():
             try:
                 result = st.session_state.builder.generate_prompt(user_input)
                 st.session_state.last_result = result
+                store = get_history_store()
+                if store is not None and st.session_state.history_owner is not None:
+                    store.save(user_input, result, owner=st.session_state.history_owner)
                 st.success("プロンプトの生成が完了しました！")
             except Exception as e:
                 st.error(f"エラーが発生しました: {str(e)}")
-                return
-    
-    # 結果の表示
+
+def display_last_result():
+    """直前の生成結果（または履歴から再利用した結果）の表示"""
     if st.session_state.last_result:
         result = st.session_state.last_result
         
@@ -181,5 +225,37 @@ def main():
             display_prompt(result["agent_prompt"])
             display_validation(result["validation_result"])
 
+def main():
+    """メイン関数"""
+    try:
+        st.set_page_config(
+            page_title="Hayashi Agent Prompt Generator",
+            page_icon="🤖",
+            layout="wide"
+        )
+    except Exception:
+        # ページ設定が既に行われている場合は無視
+        pass
+    
+    init_session_state()
+    display_api_key_input()
+    display_history_search()
+    
+    st.title("🤖 Hayashi Agent Prompt Generator")
+    st.write("""
+    このデモでは、ユーザー入力からAIエージェントのプロンプトを動的に生成します。
+    必要な機能と制約を入力してください。
+    """)
+    
+    # API Keyがなくても履歴から再利用した結果は表示する
+    if not st.session_state.api_key:
+        st.warning("⚠️ API Keyを入力してください。")
+    elif st.session_state.builder is None and not initialize_builder():
+        st.error("⚠️ PromptChainBuilderの初期化に失敗しました。")
+    else:
+        display_generation_form()
+    
+    display_last_result()
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file
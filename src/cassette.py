@@ -0,0 +1,203 @@
+"""
+LLM呼び出しの記録・再生（カセット）
+
+このモジュールは、チャットモデルの呼び出しを「カセット」ファイルとして記録し、
+以降はAPIを呼び出さずに同じ応答を決定的に再生するためのラッパーを提供します。
+テストをオフラインかつ高速に実行でき、記録時のレイテンシを再現すれば
+性能の回帰検証にも利用できます。
+
+カセットはモデル名と正規化したプロンプト（前後の空白を除き、連続する空白を1つにまとめたもの）の
+SHA-256をキーとして、<cassette_dir>/<キー>.json に1呼び出しずつ保存されます。
+ステージのモデルやフォールバック先を変更した場合は別のカセットとして扱われ、
+再生モードではCassetteMissErrorになります（記録し直してください）。
+temperatureなどの生成パラメータはキーに含めません。
+
+モード:
+    - record: 内側のモデルを呼び出し、応答を記録して返す
+    - replay: 記録済みの応答を返す（未記録の場合はCassetteMissError）
+    - auto: 記録済みなら再生し、未記録なら記録する
+
+使用例:
+    >>> from cassette import cassette_model_factory
+    >>> from prompt_chain import PromptChainBuilder
+    >>> factory = cassette_model_factory("cassettes", mode="replay")
+    >>> builder = PromptChainBuilder(model_factory=factory)
+"""
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from typing import Any, Callable, Dict, List, Optional, Union
+import hashlib
+import json
+import os
+import time
+
+MODES = ("record", "replay", "auto")
+
+class CassetteMissError(LookupError):
+    """再生モードで対応するカセットが見つからないことを示す例外"""
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    カセットのキー計算用にプロンプトを正規化
+
+    Args:
+        prompt (str): プロンプト
+
+    Returns:
+        str: 連続する空白を1つにまとめたプロンプト
+    """
+    return " ".join(prompt.split())
+
+def cassette_key(prompt: str, model_name: str) -> str:
+    """
+    モデル名とプロンプトからカセットのキーを計算
+
+    Args:
+        prompt (str): プロンプト
+        model_name (str): 呼び出すモデル名
+
+    Returns:
+        str: モデル名と正規化したプロンプトのSHA-256（16進数）
+    """
+    source = f"{model_name}\n{normalize_prompt(prompt)}"
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+class CassetteChatModel(BaseChatModel):
+    """
+    呼び出しを記録・再生するチャットモデルのラッパー
+
+    Attributes:
+        cassette_dir (str): カセットの保存先ディレクトリ
+        mode (str): record / replay / auto
+        inner (Optional[Any]): 記録時に実際に呼び出すチャットモデル
+        model_name (str): 記録するモデル名
+        latency (Optional[Union[float, str]]): 再生時の遅延（None: 遅延なし、"recorded": 記録時のレイテンシ、数値: 固定秒数）
+        speed (float): "recorded" 指定時に記録時のレイテンシに掛ける倍率
+    """
+    cassette_dir: str
+    mode: str = "replay"
+    inner: Optional[Any] = None
+    model_name: str = "cassette"
+    latency: Optional[Union[float, str]] = None
+    speed: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cassette_dir, f"{key}.json")
+
+    def _replay(self, path: str) -> str:
+        with open(path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        if self.latency == "recorded":
+            delay = entry.get("latency", 0.0) * self.speed
+        else:
+            delay = float(self.latency or 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        return entry["response"]
+
+    def _record(self, path: str, key: str, prompt: str, messages: List[BaseMessage], **kwargs: Any) -> str:
+        if self.inner is None:
+            raise ValueError("記録モードには内側のモデル（inner）が必要です")
+        started = time.perf_counter()
+        message = self.inner.invoke(messages, **kwargs)
+        latency = time.perf_counter() - started
+        response = str(message.content if hasattr(message, 'content') else message)
+        entry = {
+            "key": key,
+            "model": self.model_name,
+            "prompt": prompt,
+            "response": response,
+            "latency": latency,
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+        os.makedirs(self.cassette_dir, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+        return response
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        if self.mode not in MODES:
+            raise ValueError(f"未知のカセットモードです: {self.mode}")
+        prompt = "\n".join(str(message.content) for message in messages)
+        key = cassette_key(prompt, self.model_name)
+        path = self._path(key)
+
+        if self.mode != "record" and os.path.exists(path):
+            content = self._replay(path)
+        elif self.mode == "replay":
+            raise CassetteMissError(
+                f"カセットが見つかりません: {path}（HAYASHI_CASSETTE_MODE=record で記録してください）"
+            )
+        else:
+            content = self._record(path, key, prompt, messages, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+def cassette_model_factory(
+    cassette_dir: str,
+    mode: str = "replay",
+    base_factory: Optional[Callable[[str, Any], Any]] = None,
+    latency: Optional[Union[float, str]] = None,
+    speed: float = 1.0
+) -> Callable[[str, Any], CassetteChatModel]:
+    """
+    PromptChainBuilder の model_factory として使えるカセットモデル生成関数を作成
+
+    Args:
+        cassette_dir (str): カセットの保存先ディレクトリ
+        mode (str): record / replay / auto
+        base_factory: 記録時に内側のモデルを生成する関数（replayモードでは不要）
+        latency: 再生時の遅延（None / "recorded" / 秒数）
+        speed (float): "recorded" 指定時のレイテンシ倍率
+
+    Returns:
+        Callable: (model_name, config) からCassetteChatModelを生成する関数
+    """
+    if mode not in MODES:
+        raise ValueError(f"未知のカセットモードです: {mode}")
+
+    def factory(model_name: str, config: Any) -> CassetteChatModel:
+        inner = base_factory(model_name, config) if base_factory and mode != "replay" else None
+        return CassetteChatModel(
+            cassette_dir=cassette_dir,
+            mode=mode,
+            inner=inner,
+            model_name=model_name,
+            latency=latency,
+            speed=speed
+        )
+
+    return factory
+
+def load_cassettes(cassette_dir: str) -> Dict[str, Dict[str, Any]]:
+    """
+    ディレクトリ内のカセットをすべて読み込む
+
+    Args:
+        cassette_dir (str): カセットの保存先ディレクトリ
+
+    Returns:
+        Dict[str, Dict[str, Any]]: キーからカセット内容への対応
+    """
+    cassettes = {}
+    if not os.path.isdir(cassette_dir):
+        return cassettes
+    for name in sorted(os.listdir(cassette_dir)):
+        if name.endswith(".json"):
+            with open(os.path.join(cassette_dir, name), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            cassettes[entry["key"]] = entry
+    return cassettes
@@ -0,0 +1,233 @@
+"""
+テスト・ベンチマーク用のローカル疑似チャットモデル
+
+このモジュールは、APIを呼び出さずにプロンプトチェーン全体を動かすための
+疑似チャットモデルを提供します。レイテンシやエラー率を注入できるため、
+ルーティングやフォールバックの挙動をオフラインで検証できます。
+
+使用例:
+    >>> from fake_llm import FakeChatModel
+    >>> from prompt_chain import PromptChainBuilder
+    >>> model = FakeChatModel(latency=0.05)
+    >>> builder = PromptChainBuilder(model_factory=lambda name, config: model)
+    >>> result = builder.generate_prompt("タスク管理エージェントが必要です")
+"""
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field, PrivateAttr
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+import json
+import math
+import random
+import threading
+import time
+
+SAMPLE_AGENT_CONFIG = {
+    "role_name": "開発支援エージェント",
+    "responsibilities": ["タスク管理", "コードレビュー支援"],
+    "principles": ["効率性重視", "品質重視"],
+    "tools": [
+        {
+            "name": "task_manager",
+            "description": "タスク管理ツール",
+            "parameters": [{"name": "task_id", "type": "string"}],
+            "usage_format": "<task_manager><task_id>123</task_id></task_manager>"
+        }
+    ],
+    "constraints": ["セキュリティ重視"]
+}
+
+SAMPLE_AGENT_PROMPT = """```jinja2
+{% import 'macros/formatting.j2' as fmt %}
+◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢
+# {{ role.name }}
+Version: {{ version }}
+
+## 基本原則
+{% for principle in role.principles %}
+- {{ principle }}
+{% endfor %}
+◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢
+
+## 利用可能なツール
+{% for tool in tools %}
+### {{ tool.name }}
+{{ tool.description }}
+{% endfor %}
+```"""
+
+SAMPLE_VALIDATION_RESULT = "構文エラーは見つかりませんでした。マクロと変数の参照は整合しています。"
+
+def lognormal_latency(
+    median: float = 1.0,
+    sigma: float = 0.5,
+    seed: Optional[int] = None
+) -> Callable[[], float]:
+    """
+    対数正規分布のレイテンシを返す関数を作成
+
+    実際のLLM APIの応答時間に近い、右に裾を引く分布です。
+
+    Args:
+        median (float): レイテンシの中央値（秒）
+        sigma (float): 対数のばらつき（大きいほど遅い呼び出しが増える）
+        seed (Optional[int]): 乱数シード
+
+    Returns:
+        Callable[[], float]: 呼び出すたびにレイテンシ（秒）を返す関数
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    mu = math.log(median)
+
+    def sample() -> float:
+        with lock:
+            return rng.lognormvariate(mu, sigma)
+
+    return sample
+
+def heavy_tailed_latency(
+    base: float = 0.05,
+    alpha: float = 1.5,
+    cap: float = 60.0,
+    seed: Optional[int] = None
+) -> Callable[[], float]:
+    """
+    裾の重いレイテンシ分布（パレート分布）を返す関数を作成
+
+    ほとんどの呼び出しは base の数倍で終わりますが、まれに非常に長くかかります。
+    alpha=1.5 の場合、p95は base の約7倍、p99は約22倍になります。
+
+    Args:
+        base (float): 最小レイテンシ（秒）
+        alpha (float): パレート分布の形状パラメータ（小さいほど裾が重い）
+        cap (float): レイテンシの上限（秒）
+        seed (Optional[int]): 乱数シード
+
+    Returns:
+        Callable[[], float]: 呼び出すたびにレイテンシ（秒）を返す関数
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def sample() -> float:
+        with lock:
+            return min(cap, base * rng.paretovariate(alpha))
+
+    return sample
+
+class FakeModelError(RuntimeError):
+    """疑似モデルが注入されたエラーを発生させたことを示す例外"""
+
+class FakeModelTimeoutError(TimeoutError):
+    """疑似モデルの呼び出しがリクエストのタイムアウトを過ぎたことを示す例外"""
+
+def default_responder(prompt: str) -> str:
+    """
+    プロンプトの内容からステージを推定し、もっともらしい応答を返す
+
+    Args:
+        prompt (str): モデルに渡されたプロンプト
+
+    Returns:
+        str: ステージに応じた疑似応答
+    """
+    if "プロンプトを検証してください" in prompt:
+        return SAMPLE_VALIDATION_RESULT
+    if "プロンプトを生成してください" in prompt:
+        return SAMPLE_AGENT_PROMPT
+    return json.dumps(SAMPLE_AGENT_CONFIG, ensure_ascii=False)
+
+class FakeChatModel(BaseChatModel):
+    """
+    レイテンシとエラーを注入できる疑似チャットモデル
+
+    呼び出し時にキーワード引数 timeout（秒）を渡すと、APIクライアントのリクエストタイムアウトと
+    同様に、その時間を過ぎた時点でFakeModelTimeoutErrorを送出して呼び出しを打ち切ります。
+
+    Attributes:
+        model_name (str): 統計表示用のモデル名
+        responder (Callable[[str], str]): プロンプトから応答文字列を生成する関数
+        latency (Union[float, Callable[[], float]]): 1回の呼び出しにかかる時間（秒）、または時間を返す関数
+        error_rate (float): 注入するエラーの発生確率（0〜1）
+        chunk_size (int): ストリーミング時の1チャンクあたりの文字数
+        ttft_ratio (float): ストリーミング時に最初のチャンクまでに費やすレイテンシの割合
+        seed (Optional[int]): エラー注入用の乱数シード
+    """
+    model_name: str = "fake-chat"
+    responder: Callable[[str], str] = default_responder
+    latency: Union[float, Callable[[], float]] = 0.0
+    error_rate: float = 0.0
+    chunk_size: int = 16
+    ttft_ratio: float = 0.3
+    seed: Optional[int] = None
+    call_count: int = Field(default=0, description="呼び出し回数")
+
+    _rng: random.Random = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any):
+        super().model_post_init(__context)
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _prompt_text(self, messages: List[BaseMessage]) -> str:
+        return "\n".join(str(message.content) for message in messages)
+
+    def _next_latency(self) -> float:
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _sleep(self, seconds: float, expires_at: Optional[float]):
+        """指定時間待機する（リクエストのタイムアウトを過ぎる場合はその時点で打ち切る）"""
+        if expires_at is not None and time.monotonic() + seconds > expires_at:
+            time.sleep(max(0.0, expires_at - time.monotonic()))
+            raise FakeModelTimeoutError(f"{self.model_name}: リクエストがタイムアウトしました")
+        if seconds > 0:
+            time.sleep(seconds)
+
+    @staticmethod
+    def _expires_at(kwargs: Dict[str, Any]) -> Optional[float]:
+        timeout = kwargs.get("timeout")
+        return None if timeout is None else time.monotonic() + timeout
+
+    def _maybe_fail(self):
+        self.call_count += 1
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise FakeModelError(f"{self.model_name}: 注入されたエラー")
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        expires_at = self._expires_at(kwargs)
+        latency = self._next_latency()
+        self._maybe_fail()
+        self._sleep(latency, expires_at)
+        content = self.responder(self._prompt_text(messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        expires_at = self._expires_at(kwargs)
+        latency = self._next_latency()
+        self._maybe_fail()
+        content = self.responder(self._prompt_text(messages))
+        chunks = [content[i:i + self.chunk_size] for i in range(0, len(content), self.chunk_size)] or [""]
+        self._sleep(latency * self.ttft_ratio, expires_at)
+        per_chunk = latency * (1 - self.ttft_ratio) / len(chunks)
+        for index, text in enumerate(chunks):
+            if index:
+                self._sleep(per_chunk, expires_at)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
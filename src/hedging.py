@@ -0,0 +1,261 @@
+"""
+リクエスト期限とヘッジ呼び出し
+
+このモジュールは、generate_prompt全体の期限をステージごとの予算に分割する Deadline と、
+モデル呼び出しの裾のレイテンシ（p99）を抑えるためのヘッジ呼び出しを行う Hedger を提供します。
+
+ヘッジ呼び出しでは、呼び出しがそのステージとモデルの組み合わせのローリングp95レイテンシを
+超えても終わらない場合に同じリクエストをもう1つ送り、先に終わった方の結果を使用します。
+ヘッジの比率は max_hedge_rate で上限が設けられるため、負荷が増え続けることはありません。
+
+使用例:
+    >>> from hedging import Deadline, Hedger
+    >>> hedger = Hedger(router, max_hedge_rate=0.05)
+    >>> builder = PromptChainBuilder(router=router, hedger=hedger)
+    >>> result = builder.generate_prompt(user_input, deadline=60.0)
+    >>> hedger.report()
+    {'calls': 120, 'hedged': 6, 'hedge_rate': 0.05, 'hedge_wins': 5, 'timeouts': 0}
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+import threading
+import time
+from model_router import ModelRouter
+
+class StageTimeoutError(TimeoutError):
+    """ステージが割り当てられた期限内に完了しなかったことを示す例外"""
+
+class Deadline:
+    """
+    リクエスト全体の期限とステージごとの予算
+
+    各ステージの予算は、開始時点の残り時間を未開始のステージの配分比率で按分したものです。
+    前のステージが予算を使い切らなかった場合、残りは後のステージに回されます。
+
+    Attributes:
+        timeout (float): リクエスト全体の期限（秒）
+        shares (Dict[str, float]): ステージ名から配分比率への対応（実行順）
+    """
+
+    def __init__(self, timeout: float, shares: Dict[str, float]):
+        """
+        Args:
+            timeout (float): リクエスト全体の期限（秒）
+            shares (Dict[str, float]): ステージ名から配分比率への対応（実行順）
+        """
+        self.timeout = timeout
+        self.shares = dict(shares)
+        self._expires_at = time.monotonic() + timeout
+        self._stage_ends: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        """
+        リクエスト全体の残り時間を取得
+
+        Returns:
+            float: 残り時間（秒、期限切れの場合は0以下）
+        """
+        return self._expires_at - time.monotonic()
+
+    def stage_timeout(self, stage: str) -> float:
+        """
+        ステージの残り予算を取得
+
+        最初の呼び出しでステージの予算を確定し、以降は同じ期限までの残り時間を返します。
+
+        Args:
+            stage (str): ステージ名
+
+        Returns:
+            float: ステージの残り予算（秒）
+
+        Raises:
+            StageTimeoutError: リクエスト全体の期限が切れている場合
+        """
+        with self._lock:
+            now = time.monotonic()
+            stage_end = self._stage_ends.get(stage)
+            if stage_end is None:
+                remaining = self._expires_at - now
+                if remaining <= 0:
+                    raise StageTimeoutError(f"{stage}: リクエストの期限（{self.timeout:.1f}秒）を過ぎています")
+                pending = [name for name in self.shares if name not in self._stage_ends]
+                share = self.shares.get(stage)
+                if share is None or stage not in pending:
+                    stage_end = self._expires_at
+                else:
+                    stage_end = now + remaining * share / sum(self.shares[name] for name in pending)
+                self._stage_ends[stage] = stage_end
+            return stage_end - now
+
+class Hedger:
+    """
+    期限付き・ヘッジ付きでモデルを呼び出す実行器
+
+    呼び出しはスレッドプールで実行され、完了時にレイテンシと成否をルーターに記録します。
+    ヘッジを送るまでの待ち時間には、ルーターのモデル別統計ではなく、ステージとモデルの
+    組み合わせごとのローリングp95を使います（同じモデルが複数のステージを担当する場合でも、
+    プロンプトの長さが異なるステージのレイテンシが混ざらないようにするためです）。
+
+    ヘッジで負けた呼び出しは、開始前であれば取り消し、実行中であれば結果を破棄します。
+    期限切れで見捨てた呼び出しも同様です。実行中のスレッドは外から中断できないため、
+    期限付きの呼び出しでは fn 自身がリクエストのタイムアウトを持つ必要があります
+    （PromptChainBuilder はステージの残り予算を timeout としてモデルに渡します）。
+    タイムアウトを持たない fn は、完了するまでワーカーと接続を占有します。
+
+    期限もヘッジも不要な呼び出しは、スレッドを介さず呼び出し元で実行します。
+
+    Attributes:
+        router (ModelRouter): レイテンシ統計を保持するルーター
+        max_hedge_rate (float): 全呼び出しに対するヘッジの比率の上限（0でヘッジしない）
+        min_hedge_delay (float): ヘッジを送るまでの最小待ち時間（秒）
+        stage_stats (ModelRouter): "ステージ/モデル名" をキーとするレイテンシ統計
+    """
+
+    def __init__(
+        self,
+        router: ModelRouter,
+        max_hedge_rate: float = 0.05,
+        min_hedge_delay: float = 0.0,
+        max_workers: int = 16
+    ):
+        self.router = router
+        self.max_hedge_rate = max_hedge_rate
+        self.min_hedge_delay = min_hedge_delay
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+        self.stage_stats = ModelRouter(
+            window_size=router.window_size,
+            min_samples=router.min_samples,
+            max_age=router.max_age
+        )
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hayashi-hedge")
+
+    @staticmethod
+    def stats_key(model_name: str, stage: Optional[str] = None) -> str:
+        """ステージ別統計のキー（ステージ未指定の場合はモデル名のみ）"""
+        return model_name if stage is None else f"{stage}/{model_name}"
+
+    def hedge_delay(self, model_name: str, stage: Optional[str] = None) -> Optional[float]:
+        """
+        ヘッジを送るまでの待ち時間（ステージとモデルのローリングp95レイテンシ）を取得
+
+        Args:
+            model_name (str): モデル名
+            stage (Optional[str]): ステージ名
+
+        Returns:
+            Optional[float]: 待ち時間（秒）。ヘッジが無効、または統計が不足している場合はNone
+        """
+        if self.max_hedge_rate <= 0:
+            return None
+        stats = self.stage_stats.stats(self.stats_key(model_name, stage))
+        if stats["count"] < self.stage_stats.min_samples:
+            return None
+        return max(stats["p95"], self.min_hedge_delay)
+
+    def _attempt(self, model_name: str, stage: Optional[str], fn: Callable[[], Any]) -> Any:
+        """1回の呼び出しを実行し、レイテンシと成否を記録する"""
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception:
+            self._record(model_name, stage, time.perf_counter() - started, ok=False)
+            raise
+        self._record(model_name, stage, time.perf_counter() - started)
+        return result
+
+    def _record(self, model_name: str, stage: Optional[str], latency: float, ok: bool = True):
+        self.router.record(model_name, latency, ok=ok)
+        self.stage_stats.record(self.stats_key(model_name, stage), latency, ok=ok)
+
+    def _try_acquire_hedge(self) -> bool:
+        """ヘッジの比率が上限を超えない場合のみヘッジ枠を確保する"""
+        with self._lock:
+            if self.hedged + 1 > self.max_hedge_rate * self.calls:
+                return False
+            self.hedged += 1
+            return True
+
+    def call(
+        self,
+        model_name: str,
+        fn: Callable[[], Any],
+        timeout: Optional[float] = None,
+        stage: Optional[str] = None
+    ) -> Any:
+        """
+        期限付き・ヘッジ付きでモデルを呼び出す
+
+        Args:
+            model_name (str): 統計の記録に使うモデル名
+            fn (Callable[[], Any]): モデル呼び出し（ヘッジ時は2回呼ばれる）
+            timeout (Optional[float]): 呼び出しの期限（秒、Noneの場合は無制限）
+            stage (Optional[str]): ヘッジの待ち時間の統計に使うステージ名
+
+        Returns:
+            先に成功した呼び出しの結果
+
+        Raises:
+            StageTimeoutError: 期限内にどの呼び出しも成功しなかった場合
+        """
+        with self._lock:
+            self.calls += 1
+        delay = self.hedge_delay(model_name, stage)
+        if delay is None and timeout is None:
+            return self._attempt(model_name, stage, fn)
+
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        primary = self._executor.submit(self._attempt, model_name, stage, fn)
+        pending: List[Future] = [primary]
+        hedge: Optional[Future] = None
+        if delay is not None and (timeout is None or delay < timeout):
+            done, _ = wait(pending, timeout=delay)
+            if not done and self._try_acquire_hedge():
+                hedge = self._executor.submit(self._attempt, model_name, stage, fn)
+                pending.append(hedge)
+
+        last_error: Optional[BaseException] = None
+        while pending:
+            remaining = None if expires_at is None else max(0.0, expires_at - time.monotonic())
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                for future in pending:
+                    future.cancel()
+                with self._lock:
+                    self.timeouts += 1
+                raise StageTimeoutError(f"{model_name}: {timeout:.2f}秒以内に応答がありませんでした")
+            for future in done:
+                pending.remove(future)
+                error = future.exception()
+                if error is not None:
+                    last_error = error
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                if future is hedge:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return future.result()
+        raise last_error
+
+    def report(self) -> Dict[str, Any]:
+        """
+        ヘッジの統計を取得
+
+        Returns:
+            Dict[str, Any]: calls, hedged, hedge_rate, hedge_wins, timeouts
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_rate": self.hedged / self.calls if self.calls else 0.0,
+                "hedge_wins": self.hedge_wins,
+                "timeouts": self.timeouts
+            }
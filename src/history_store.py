@@ -0,0 +1,259 @@
+"""
+生成履歴の永続化と全文検索
+
+このモジュールは、生成したAgentConfig・プロンプト・検証結果をSQLiteに保存し、
+入力テキスト・役割名・ツール・制約条件を全文検索（FTS5）で引けるようにします。
+過去の結果を再利用することで、似たエージェントのために3回のLLM呼び出しを
+繰り返す必要がなくなります。
+
+書き込みはバックグラウンドのスレッドでまとめて行う（write-behind）ため、
+save() はキューに積むだけで、リクエストの処理をブロックしません。
+
+日本語を分かち書きなしで検索できるよう、FTS5のtrigramトークナイザを使用します。
+3文字未満の検索語はLIKEによる部分一致で検索します。
+
+履歴は所有者（owner）ごとに分離されます。保存・検索・取得で同じ所有者を指定した
+履歴だけが見えるため、複数の利用者が1つのデータベースを共有しても互いの入力は見えません。
+所有者には owner_for() で利用者の識別情報（APIキーなど）から導いた値を使うため、
+再読み込みや別のセッションでも同じ利用者には同じ履歴が見えます。
+
+使用例:
+    >>> from history_store import HistoryStore, owner_for
+    >>> store = HistoryStore("history.db")
+    >>> owner = owner_for(api_key)
+    >>> store.save(user_input, builder.generate_prompt(user_input), owner=owner)
+    >>> entries = store.search("コードレビュー", owner=owner)
+    >>> result = store.get(entries[0]["id"], owner=owner)
+"""
+
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+import hashlib
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from prompt_chain import AgentConfig
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    owner TEXT NOT NULL DEFAULT '',
+    user_input TEXT NOT NULL,
+    role_name TEXT NOT NULL,
+    agent_config TEXT NOT NULL,
+    agent_prompt TEXT NOT NULL,
+    validation_result TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    user_input, role_name, tools, constraints,
+    tokenize = 'trigram'
+);
+"""
+
+_FTS_COLUMNS = ("user_input", "role_name", "tools", "constraints")
+
+def owner_for(identity: str) -> str:
+    """
+    利用者の識別情報から履歴の所有者を導く
+
+    識別情報そのものはデータベースに保存せず、SHA-256のハッシュを所有者として使います。
+
+    Args:
+        identity (str): 利用者ごとに一定の識別情報（APIキーや認証済みのユーザー名など）
+
+    Returns:
+        str: 履歴の所有者
+    """
+    return hashlib.sha256(f"hayashi-history:{identity}".encode("utf-8")).hexdigest()
+
+class HistoryStore:
+    """
+    SQLiteに生成履歴を保存し、全文検索を提供するストア
+
+    Attributes:
+        db_path (str): データベースファイルのパス
+        batch_size (int): 1トランザクションでまとめて書き込む最大件数
+        flush_interval (float): 書き込みをまとめるために待つ最大時間（秒）
+    """
+
+    def __init__(self, db_path: str = "history.db", batch_size: int = 32, flush_interval: float = 0.5):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # 所有者の列がない旧バージョンのデータベースを移行
+            if "owner" not in {row["name"] for row in conn.execute("PRAGMA table_info(history)")}:
+                conn.execute("ALTER TABLE history ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            conn.execute("CREATE INDEX IF NOT EXISTS history_owner ON history (owner, id)")
+            conn.commit()
+        self._writer = threading.Thread(target=self._write_loop, name="hayashi-history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def save(self, user_input: str, result: Dict[str, Any], owner: str = ""):
+        """
+        生成結果を保存キューに追加（ブロックしない）
+
+        Args:
+            user_input (str): ユーザーからの入力テキスト
+            result (Dict[str, Any]): generate_promptの結果
+            owner (str): 履歴の所有者（利用者やセッションの識別子）
+        """
+        self._queue.put((time.time(), owner, user_input, result))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        キューに積まれた保存がすべて書き込まれるまで待つ
+
+        Args:
+            timeout (Optional[float]): 最大待ち時間（秒）
+
+        Returns:
+            bool: 時間内に書き込みが完了した場合はTrue
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """未書き込みの保存を書き込んでから書き込みスレッドを停止"""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    def _write_loop(self):
+        """キューから取り出した保存をバッチでまとめて書き込む"""
+        with closing(self._connect()) as conn:
+            while True:
+                item = self._queue.get()
+                batch, events, stopping = [], [], False
+                deadline = time.monotonic() + self.flush_interval
+                while True:
+                    if item is None:
+                        stopping = True
+                    elif isinstance(item, threading.Event):
+                        events.append(item)
+                    else:
+                        batch.append(item)
+                    if stopping or events or len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                if batch:
+                    try:
+                        self._write_batch(conn, batch)
+                    except Exception as e:
+                        logger.error(f"履歴の書き込みに失敗: {e}")
+                for event in events:
+                    event.set()
+                if stopping:
+                    return
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Any]):
+        """1トランザクションでまとめて書き込む"""
+        with conn:
+            for created_at, owner, user_input, result in batch:
+                config = result["agent_config"]
+                cursor = conn.execute(
+                    "INSERT INTO history (created_at, owner, user_input, role_name, agent_config, agent_prompt, validation_result) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        created_at,
+                        owner,
+                        user_input,
+                        config.role_name,
+                        config.model_dump_json(),
+                        str(result["agent_prompt"]),
+                        str(result["validation_result"])
+                    )
+                )
+                conn.execute(
+                    "INSERT INTO history_fts (rowid, user_input, role_name, tools, constraints) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        cursor.lastrowid,
+                        user_input,
+                        config.role_name,
+                        "\n".join(f"{tool.name} {tool.description}" for tool in config.tools),
+                        "\n".join(config.constraints)
+                    )
+                )
+
+    def search(self, query: str = "", limit: int = 20, owner: str = "") -> List[Dict[str, Any]]:
+        """
+        所有者の履歴を検索
+
+        空白で区切った語をすべて含む履歴を、関連度（BM25）の高い順に返します。
+        クエリが空の場合は新しい順に返します。
+
+        Args:
+            query (str): 検索語
+            limit (int): 最大件数
+            owner (str): 履歴の所有者
+
+        Returns:
+            List[Dict[str, Any]]: id, created_at, role_name, user_input を含む履歴の概要
+        """
+        terms = query.split()
+        columns = "h.id, h.created_at, h.role_name, h.user_input"
+        if not terms:
+            sql = f"SELECT {columns} FROM history h WHERE h.owner = ? ORDER BY h.id DESC LIMIT ?"
+            params: List[Any] = [owner, limit]
+        elif all(len(term) >= 3 for term in terms):
+            match = " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+            sql = (
+                f"SELECT {columns} FROM history_fts f JOIN history h ON h.id = f.rowid "
+                "WHERE history_fts MATCH ? AND h.owner = ? ORDER BY bm25(history_fts), h.id DESC LIMIT ?"
+            )
+            params = [match, owner, limit]
+        else:
+            conditions = []
+            params = []
+            for term in terms:
+                pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                conditions.append("(" + " OR ".join(f"f.{column} LIKE ? ESCAPE '\\'" for column in _FTS_COLUMNS) + ")")
+                params.extend([pattern] * len(_FTS_COLUMNS))
+            sql = (
+                f"SELECT {columns} FROM history_fts f JOIN history h ON h.id = f.rowid "
+                f"WHERE {' AND '.join(conditions)} AND h.owner = ? ORDER BY h.id DESC LIMIT ?"
+            )
+            params.extend([owner, limit])
+        with closing(self._connect()) as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def get(self, entry_id: int, owner: str = "") -> Optional[Dict[str, Any]]:
+        """
+        所有者の履歴を取得してgenerate_promptの結果と同じ形式で返す
+
+        Args:
+            entry_id (int): 履歴ID
+            owner (str): 履歴の所有者（他の所有者の履歴はNone）
+
+        Returns:
+            Optional[Dict[str, Any]]: agent_config, agent_prompt, validation_result などを含む結果（存在しない場合はNone）
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM history WHERE id = ? AND owner = ?", (entry_id, owner)).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "created_at": row["created_at"],
+            "user_input": row["user_input"],
+            "agent_config": AgentConfig.model_validate_json(row["agent_config"]),
+            "agent_prompt": row["agent_prompt"],
+            "validation_result": row["validation_result"]
+        }
@@ -2,8 +2,10 @@ from jinja2 import Environment, FileSystemLoader
 import yaml
 import os
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from prompt_chain import PromptChainBuilder, Tool
+from profiling import profile_section
+from tool_index import ToolIndex
 
 # ロギングの設定
 logging.basicConfig(
@@ -13,7 +15,13 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class HayashiAgent:
-    def __init__(self, config_path: str, tools_config_path: str, templates_path: str):
+    def __init__(
+        self,
+        config_path: str,
+        tools_config_path: str,
+        templates_path: str,
+        profile: Optional[bool] = None
+    ):
         """
         Hayashiエージェントの初期化
         
@@ -21,12 +29,14 @@ class HayashiAgent:
             config_path (str): 設定ファイルのパス
             tools_config_path (str): ツール設定ファイルのパス
             templates_path (str): テンプレートディレクトリのパス
+            profile (Optional[bool]): Trueで初期化処理をプロファイル（Noneの場合は環境変数HAYASHI_PROFILEに従う）
         """
-        self.config = self._load_config(config_path)
-        self.tools_config = self._load_config(tools_config_path)
-        self.env = Environment(loader=FileSystemLoader(templates_path))
-        self.prompt_builder = PromptChainBuilder()
-        self.initialize_environment()
+        with profile_section("HayashiAgent.__init__", enabled=profile):
+            self.config = self._load_config(config_path)
+            self.tools_config = self._load_config(tools_config_path)
+            self.env = Environment(loader=FileSystemLoader(templates_path))
+            self.prompt_builder = PromptChainBuilder()
+            self.initialize_environment()
         
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """
@@ -63,6 +73,26 @@ class HayashiAgent:
                 tools.append(tool)
             self.config['tools'] = tools
         
+        # ツールの関連度インデックスは読み込み時に一度だけ構築
+        self.tool_index = ToolIndex(self.config.get('tools', []))
+        
+    def select_tools(self, query: Optional[str] = None) -> List[Tool]:
+        """
+        クエリに関連するツールを選択
+        
+        Args:
+            query (Optional[str]): 検索クエリ（空の場合は全ツール）
+            
+        Returns:
+            List[Tool]: 固定ツールと関連度上位のツール
+        """
+        selection = self.config.get('tool_selection', {})
+        return self.tool_index.select(
+            query,
+            top_k=selection.get('top_k', 10),
+            pinned=selection.get('pinned', [])
+        )
+        
     def generate_dynamic_prompt(self, user_input: str) -> Dict[str, Any]:
         """
         動的プロンプトを生成
@@ -73,18 +103,23 @@ class HayashiAgent:
         Returns:
             Dict[str, Any]: 生成されたプロンプトと検証結果
         """
-        return self.prompt_builder.generate_prompt(user_input)
+        return self.prompt_builder.generate_prompt(user_input, tools=self.select_tools(user_input))
         
-    def render_prompt(self) -> str:
+    def render_prompt(self, query: Optional[str] = None, profile: Optional[bool] = None) -> str:
         """
         プロンプトをレンダリング
         
+        Args:
+            query (Optional[str]): 指定した場合は関連度上位のツールのみを描画
+            profile (Optional[bool]): Trueでこの呼び出しをプロファイル（Noneの場合は環境変数HAYASHI_PROFILEに従う）
+            
         Returns:
             str: レンダリングされたプロンプト
         """
         try:
-            template = self.env.get_template('hayashi_agent.j2')
-            return template.render(**self.config)
+            with profile_section("render_prompt", enabled=profile):
+                template = self.env.get_template('hayashi_agent.j2')
+                return template.render(**{**self.config, 'tools': self.select_tools(query)})
         except Exception as e:
             logger.error(f"プロンプトのレンダリングに失敗: {e}")
             raise
@@ -0,0 +1,192 @@
+"""
+ステージ別モデル設定とレイテンシ考慮ルーティング
+
+このモジュールは、プロンプトチェーンの各ステージ（役割分析・プロンプト生成・検証）に
+個別のモデル設定を割り当て、モデルごとのレイテンシとエラー率を追跡して
+遅延・障害時に代替モデルへ自動的にフォールバックする仕組みを提供します。
+
+使用例:
+    >>> from model_router import ModelRouter, StageModelConfig
+    >>> router = ModelRouter(latency_threshold=20.0)
+    >>> config = StageModelConfig(model="claude-3-haiku-20240307", fallback_model="claude-3-sonnet-20240229")
+    >>> router.route(config)
+    ['claude-3-haiku-20240307', 'claude-3-sonnet-20240229']
+"""
+
+from collections import deque
+from pydantic import BaseModel, Field
+from typing import Deque, Dict, List, Optional, Tuple
+import math
+import threading
+import time
+
+ROLE_ANALYSIS = "role_analysis"
+PROMPT_GENERATION = "prompt_generation"
+VALIDATION = "validation"
+
+STAGES = (ROLE_ANALYSIS, PROMPT_GENERATION, VALIDATION)
+
+class StageModelConfig(BaseModel):
+    """
+    1ステージ分のモデル設定
+
+    Attributes:
+        model (str): 使用するモデル名
+        temperature (float): サンプリング温度
+        max_tokens (int): 最大出力トークン数
+        fallback_model (Optional[str]): 遅延・障害時に使用する代替モデル名
+        deadline_share (float): 全体の期限のうちこのステージに割り当てる比率
+    """
+    model: str = Field(description="使用するモデル名")
+    temperature: float = Field(default=0.7, description="サンプリング温度")
+    max_tokens: int = Field(default=1024, description="最大出力トークン数")
+    fallback_model: Optional[str] = Field(default=None, description="代替モデル名")
+    deadline_share: float = Field(default=1.0, gt=0, description="期限の配分比率")
+
+# 検証と役割分析は軽量モデルで十分なため、生成ステージのみ大きなモデルを使用する
+DEFAULT_STAGE_CONFIGS: Dict[str, StageModelConfig] = {
+    ROLE_ANALYSIS: StageModelConfig(
+        model="claude-3-haiku-20240307",
+        temperature=0.3,
+        max_tokens=2048,
+        fallback_model="claude-3-sonnet-20240229",
+        deadline_share=0.35
+    ),
+    PROMPT_GENERATION: StageModelConfig(
+        model="claude-3-sonnet-20240229",
+        temperature=0.7,
+        max_tokens=4096,
+        fallback_model="claude-3-haiku-20240307",
+        deadline_share=0.45
+    ),
+    VALIDATION: StageModelConfig(
+        model="claude-3-haiku-20240307",
+        temperature=0.0,
+        max_tokens=1024,
+        fallback_model="claude-3-sonnet-20240229",
+        deadline_share=0.2
+    ),
+}
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    パーセンタイル値を計算（最近傍法）
+
+    Args:
+        values (List[float]): 計測値のリスト
+        pct (float): パーセンタイル（0〜100）
+
+    Returns:
+        float: パーセンタイル値（値が空の場合は0.0）
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+class ModelRouter:
+    """
+    モデルごとのローリング統計に基づいてステージのモデルを選択するルーター
+
+    直近 window_size 回の呼び出しについてレイテンシと成否を保持し、
+    p95レイテンシまたはエラー率がしきい値を超えたモデルを不健全とみなします。
+    不健全なモデルは代替モデルの後ろに回されます。max_age 秒より古いサンプルは
+    統計から除外されるため、一度外れたモデルも時間の経過とともに再び試行されます。
+
+    Attributes:
+        window_size (int): 統計を保持する直近の呼び出し回数
+        latency_threshold (float): 不健全とみなすp95レイテンシ（秒）
+        error_rate_threshold (float): 不健全とみなすエラー率（0〜1）
+        min_samples (int): 判定に必要な最小サンプル数
+        max_age (float): サンプルを統計に含める最大経過時間（秒）
+    """
+
+    def __init__(
+        self,
+        window_size: int = 50,
+        latency_threshold: float = 30.0,
+        error_rate_threshold: float = 0.5,
+        min_samples: int = 5,
+        max_age: float = 300.0
+    ):
+        self.window_size = window_size
+        self.latency_threshold = latency_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.max_age = max_age
+        self._samples: Dict[str, Deque[Tuple[float, float, bool]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, latency: float, ok: bool = True):
+        """
+        呼び出し結果を記録
+
+        Args:
+            model (str): モデル名
+            latency (float): 呼び出しにかかった時間（秒）
+            ok (bool): 呼び出しが成功したかどうか
+        """
+        with self._lock:
+            samples = self._samples.get(model)
+            if samples is None:
+                samples = self._samples[model] = deque(maxlen=self.window_size)
+            samples.append((time.monotonic(), latency, ok))
+
+    def stats(self, model: str) -> Dict[str, float]:
+        """
+        モデルのローリング統計を取得
+
+        Args:
+            model (str): モデル名
+
+        Returns:
+            Dict[str, float]: count, p50, p95, error_rate を含む統計
+        """
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            samples = [(latency, ok) for recorded_at, latency, ok in self._samples.get(model, ()) if recorded_at >= cutoff]
+        latencies = [latency for latency, ok in samples if ok]
+        errors = sum(1 for _, ok in samples if not ok)
+        return {
+            "count": len(samples),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "error_rate": errors / len(samples) if samples else 0.0
+        }
+
+    def is_healthy(self, model: str) -> bool:
+        """
+        モデルが健全かどうかを判定
+
+        サンプル数が min_samples に満たない場合は健全とみなします。
+
+        Args:
+            model (str): モデル名
+
+        Returns:
+            bool: 健全な場合はTrue
+        """
+        stats = self.stats(model)
+        if stats["count"] < self.min_samples:
+            return True
+        if stats["error_rate"] > self.error_rate_threshold:
+            return False
+        return stats["p95"] <= self.latency_threshold
+
+    def route(self, config: StageModelConfig) -> List[str]:
+        """
+        ステージ設定から呼び出し候補のモデルを優先順に返す
+
+        Args:
+            config (StageModelConfig): ステージのモデル設定
+
+        Returns:
+            List[str]: 試行するモデル名のリスト（先頭から順に試行）
+        """
+        candidates = [config.model]
+        if config.fallback_model and config.fallback_model != config.model:
+            candidates.append(config.fallback_model)
+        if len(candidates) > 1 and not self.is_healthy(config.model) and self.is_healthy(config.fallback_model):
+            candidates.reverse()
+        return candidates
@@ -0,0 +1,267 @@
+"""
+オンデマンドプロファイリング
+
+このモジュールは、プロンプト生成・レンダリング経路のどこでPython時間が使われているかを
+調べるためのオプトイン型プロファイラを提供します。リクエスト単位の指定、または環境変数で
+有効化でき、サンプリング率を下げれば本番環境で常時有効にしておくこともできます。
+
+出力ファイル（HAYASHI_PROFILE_DIR 配下、1セクションにつき1組）:
+    - <name>-<時刻>-<pid>-<連番>.prof: cProfileの統計（pstats / snakeviz で閲覧）
+    - <name>-<時刻>-<pid>-<連番>.collapsed: スタックサンプリングの折り畳みスタック（flamegraph.pl / speedscope 形式）
+    - <name>-<時刻>-<pid>-<連番>.tracemalloc: tracemallocのスナップショット（メモリ計測有効時）
+    - <name>-<時刻>-<pid>-<連番>-alloc.txt: 割り当て量上位の行（メモリ計測有効時）
+
+環境変数:
+    HAYASHI_PROFILE: "1" / "true" で有効化
+    HAYASHI_PROFILE_DIR: 出力先ディレクトリ（既定: profiles）
+    HAYASHI_PROFILE_SAMPLE_RATE: プロファイルする呼び出しの割合（0〜1、既定: 1.0）
+    HAYASHI_PROFILE_MEMORY: "1" / "true" でtracemallocによる割り当ても記録
+    HAYASHI_PROFILE_INTERVAL: スタックサンプリング間隔（秒、既定: 0.005）
+
+計測範囲:
+    cProfileは1プロセスで同時に1つしか有効にできない（Python 3.12以降）ため、計測は
+    プロセス全体で同時に1セクションのみです。他のセクションを計測中に開始された呼び出しは
+    プロファイルせずにそのまま実行します。
+    cProfileの統計はセクションを開始したスレッドのみを対象とします。ステージ実行用の
+    ワーカースレッド（hayashi-stage / hayashi-hedge）はスタックサンプリングでのみ採取され、
+    折り畳みスタックの先頭にスレッド名が付きます。ワーカーは他のリクエストと共有されるため、
+    並行するリクエストのスタックが混ざる場合があります。
+
+使用例:
+    >>> from profiling import profile_section
+    >>> with profile_section("generate_prompt", enabled=True):
+    ...     builder.generate_prompt("タスク管理エージェントが必要です")
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+import cProfile
+import itertools
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+_TRUE_VALUES = ("1", "true", "yes", "on")
+
+# 同一スレッド内で入れ子になったセクションは外側のセクションに含めて計測する
+_local = threading.local()
+_sequence = itertools.count()
+
+# cProfileはプロセス全体で同時に1つしか有効にできないため、計測中のセクションは1つに限る
+_profiler_lock = threading.Lock()
+
+# スタックサンプリングで呼び出し元スレッドに加えて採取するワーカースレッドの名前の接頭辞
+WORKER_THREAD_PREFIXES = ("hayashi-stage", "hayashi-hedge")
+
+class ProfileSettings:
+    """
+    プロファイリングの設定
+
+    Attributes:
+        enabled (bool): 明示指定のない呼び出しをプロファイル対象にするか
+        output_dir (str): 出力先ディレクトリ
+        sample_rate (float): プロファイルする呼び出しの割合（0〜1）
+        memory (bool): tracemallocで割り当てを記録するか
+        interval (float): スタックサンプリング間隔（秒）
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        output_dir: str = "profiles",
+        sample_rate: float = 1.0,
+        memory: bool = False,
+        interval: float = 0.005
+    ):
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.memory = memory
+        self.interval = interval
+
+    @classmethod
+    def from_env(cls) -> "ProfileSettings":
+        """
+        環境変数から設定を読み込む
+
+        Returns:
+            ProfileSettings: 環境変数に基づく設定
+        """
+        return cls(
+            enabled=os.getenv("HAYASHI_PROFILE", "").lower() in _TRUE_VALUES,
+            output_dir=os.getenv("HAYASHI_PROFILE_DIR", "profiles"),
+            sample_rate=float(os.getenv("HAYASHI_PROFILE_SAMPLE_RATE", "1.0")),
+            memory=os.getenv("HAYASHI_PROFILE_MEMORY", "").lower() in _TRUE_VALUES,
+            interval=float(os.getenv("HAYASHI_PROFILE_INTERVAL", "0.005"))
+        )
+
+    def should_profile(self, enabled: Optional[bool] = None) -> bool:
+        """
+        今回の呼び出しをプロファイルするかを決定
+
+        Args:
+            enabled (Optional[bool]): 呼び出し側の明示指定（Noneの場合は設定とサンプリング率に従う）
+
+        Returns:
+            bool: プロファイルする場合はTrue
+        """
+        if enabled is not None:
+            return enabled
+        return self.enabled and random.random() < self.sample_rate
+
+class StackSampler(threading.Thread):
+    """
+    対象スレッドのスタックを一定間隔で採取し、折り畳みスタックとして集計するスレッド
+
+    名前が worker_prefixes で始まるスレッドは、タスクを実行中の場合のみ採取し、
+    スタックの先頭にスレッド名を付けます。
+
+    Attributes:
+        target_id (int): 採取対象のスレッドID
+        interval (float): 採取間隔（秒）
+        worker_prefixes (Tuple[str, ...]): あわせて採取するワーカースレッドの名前の接頭辞
+        stacks (Counter): 折り畳みスタック文字列ごとの採取回数
+    """
+
+    def __init__(self, target_id: int, interval: float, worker_prefixes: Tuple[str, ...] = WORKER_THREAD_PREFIXES):
+        super().__init__(name="hayashi-stack-sampler", daemon=True)
+        self.target_id = target_id
+        self.interval = interval
+        self.worker_prefixes = worker_prefixes
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _collapse(frame) -> List[str]:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return list(reversed(names))
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            frame = frames.get(self.target_id)
+            if frame is not None:
+                self.stacks[";".join(self._collapse(frame))] += 1
+            if not self.worker_prefixes:
+                continue
+            for thread in threading.enumerate():
+                if thread.ident == self.target_id or not thread.name.startswith(self.worker_prefixes):
+                    continue
+                frame = frames.get(thread.ident)
+                if frame is None:
+                    continue
+                names = self._collapse(frame)
+                # 待機中のワーカー（タスクを実行していない）は除外する
+                if "thread.py:run" not in names:
+                    continue
+                self.stacks[";".join([thread.name] + names)] += 1
+
+    def stop(self):
+        """採取を停止してスレッドの終了を待つ"""
+        self._stop_event.set()
+        self.join()
+
+    def write(self, path: str):
+        """
+        折り畳みスタック形式で書き出す
+
+        Args:
+            path (str): 出力ファイルのパス
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+@contextmanager
+def profile_section(
+    name: str,
+    enabled: Optional[bool] = None,
+    settings: Optional[ProfileSettings] = None
+) -> Iterator[Optional[str]]:
+    """
+    ブロック内の処理をプロファイルするコンテキストマネージャ
+
+    プロファイル対象外の場合、同一スレッド内で入れ子になった場合、および他のセクションを
+    計測中の場合は何もしません。
+
+    Args:
+        name (str): セクション名（出力ファイル名の接頭辞）
+        enabled (Optional[bool]): Trueで強制的に計測、Falseで計測しない、Noneで環境変数の設定に従う
+        settings (Optional[ProfileSettings]): 設定（省略時は環境変数から読み込む）
+
+    Yields:
+        Optional[str]: 出力ファイルの接頭辞パス（計測しない場合はNone）
+    """
+    settings = settings or ProfileSettings.from_env()
+    if getattr(_local, "active", False) or not settings.should_profile(enabled):
+        yield None
+        return
+    if not _profiler_lock.acquire(blocking=False):
+        logger.info(f"{name}: 他のセクションを計測中のため、プロファイルせずに実行します")
+        yield None
+        return
+    try:
+        with _profile(name, settings) as base:
+            yield base
+    finally:
+        _profiler_lock.release()
+
+@contextmanager
+def _profile(name: str, settings: ProfileSettings) -> Iterator[Optional[str]]:
+    """_profiler_lock を保持した状態で1セクションを計測する"""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # このモジュール以外のプロファイラ（デバッガなど）が有効な場合
+        logger.info(f"{name}: プロファイラを開始できないため、プロファイルせずに実行します: {e}")
+        yield None
+        return
+    profiler.disable()
+
+    os.makedirs(settings.output_dir, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    base = os.path.join(settings.output_dir, f"{name}-{stamp}-{os.getpid()}-{next(_sequence)}")
+
+    trace_memory = settings.memory and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start()
+    sampler = StackSampler(threading.get_ident(), settings.interval)
+
+    _local.active = True
+    sampler.start()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        yield base
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - started
+        sampler.stop()
+        _local.active = False
+        try:
+            profiler.dump_stats(f"{base}.prof")
+            sampler.write(f"{base}.collapsed")
+            if settings.memory and tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+                snapshot.dump(f"{base}.tracemalloc")
+                with open(f"{base}-alloc.txt", 'w', encoding='utf-8') as f:
+                    for stat in snapshot.statistics("lineno")[:30]:
+                        f.write(f"{stat}\n")
+            logger.info(f"プロファイルを出力: {base} ({elapsed * 1000:.1f}ms)")
+        except Exception as e:
+            logger.error(f"プロファイルの書き出しに失敗: {e}")
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
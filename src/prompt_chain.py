@@ -21,17 +21,36 @@ Jinja2テンプレートとLangchainを使用して、柔軟で再利用可能
 """
 
 from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnableSequence, RunnableLambda
+from langchain_core.runnables import RunnableConfig, RunnableSequence, RunnableLambda
 from langchain_anthropic import ChatAnthropic
 from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import partial
+import logging
 import os
+import queue
+import threading
+import time
 from dotenv import load_dotenv
+from hedging import Deadline, Hedger, StageTimeoutError
+from model_router import (
+    DEFAULT_STAGE_CONFIGS,
+    PROMPT_GENERATION,
+    ROLE_ANALYSIS,
+    VALIDATION,
+    ModelRouter,
+    StageModelConfig,
+)
+from profiling import profile_section
+from stream_parser import StreamingModelParser
 
 # 環境変数の読み込み
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class Tool(BaseModel):
     """
     ツール定義の構造を表すモデル
@@ -73,38 +92,291 @@ class PromptChainBuilder:
     2. プロンプト生成チェーン
     3. 検証チェーン
 
+    各ステージは個別のモデル設定（モデル名・温度・最大トークン数）を持ち、
+    ModelRouterが遅延・障害を検知した場合は代替モデルへフォールバックします。
+    generate_promptに期限を指定すると、期限はステージごとの予算に分割され、
+    Hedgerがヘッジ呼び出しと期限切れの検出を行います。
+
     Attributes:
-        llm: 言語モデル（Claude 3.5 Sonnet）
+        stage_configs: ステージ名からStageModelConfigへの対応
+        router: モデル選択とフォールバックを行うルーター
+        hedger: 期限付き・ヘッジ付きの呼び出しを行う実行器
+        llm: プロンプト生成ステージの主モデル（後方互換用）
         config_parser: AgentConfig用のPydanticパーサー
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        stage_configs: Optional[Dict[str, Union[StageModelConfig, Dict[str, Any]]]] = None,
+        router: Optional[ModelRouter] = None,
+        model_factory: Optional[Callable[[str, StageModelConfig], Any]] = None,
+        hedger: Optional[Hedger] = None
+    ):
         """
         プロンプトチェーンビルダーの初期化
 
-        環境変数ANTHROPIC_API_KEYが必要です。
+        model_factoryを指定しない場合は環境変数ANTHROPIC_API_KEYが必要です。
+
+        Args:
+            stage_configs: ステージごとのモデル設定（指定した項目のみ既定値を上書き）
+            router: モデルルーター（省略時は既定の設定で生成）
+            model_factory: モデル名とステージ設定からチャットモデルを生成する関数
+                （期限付きの呼び出しでは、ステージの残り予算をキーワード引数 timeout（秒）として
+                invoke / stream に渡すため、生成するモデルはリクエストのタイムアウトとして扱うこと）
+            hedger: ヘッジ呼び出しの実行器（省略時はヘッジなしで期限のみを適用）
+
+        Raises:
+            ValueError: 未知のステージ名が指定された場合
         """
-        self.llm = ChatAnthropic(
-            temperature=0.7,
-            model="claude-3-sonnet-20240229",
+        self.stage_configs: Dict[str, StageModelConfig] = dict(DEFAULT_STAGE_CONFIGS)
+        for stage, config in (stage_configs or {}).items():
+            if stage not in DEFAULT_STAGE_CONFIGS:
+                raise ValueError(f"未知のステージです: {stage}")
+            if isinstance(config, StageModelConfig):
+                config = config.model_dump(exclude_unset=True)
+            self.stage_configs[stage] = StageModelConfig.model_validate(
+                {**DEFAULT_STAGE_CONFIGS[stage].model_dump(), **config}
+            )
+        self.router = router or ModelRouter()
+        self.hedger = hedger or Hedger(self.router, max_hedge_rate=0.0)
+        self.model_factory = model_factory or self._create_anthropic_model
+        self._models: Dict[Tuple[str, float, int], Any] = {}
+        self._models_lock = threading.Lock()
+        generation_config = self.stage_configs[PROMPT_GENERATION]
+        self.llm = self._get_model(generation_config.model, generation_config)
+        self.config_parser = PydanticOutputParser(pydantic_object=AgentConfig)
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hayashi-stage")
+
+    @staticmethod
+    def _create_anthropic_model(model_name: str, config: StageModelConfig) -> ChatAnthropic:
+        """既定のモデル生成関数（Anthropic API）"""
+        return ChatAnthropic(
+            temperature=config.temperature,
+            max_tokens=config.max_tokens,
+            model=model_name,
             anthropic_api_key=os.getenv("ANTHROPIC_API_KEY")
         )
-        self.config_parser = PydanticOutputParser(pydantic_object=AgentConfig)
 
-    def create_role_analysis_chain(self) -> RunnableSequence:
+    def _get_model(self, model_name: str, config: StageModelConfig) -> Any:
         """
-        役割分析チェーンを作成
+        モデルインスタンスを取得（同一設定のモデルは再利用）
 
-        ユーザー入力を分析し、エージェントの設定を生成します。
+        Args:
+            model_name (str): モデル名
+            config (StageModelConfig): 温度と最大トークン数を持つステージ設定
 
         Returns:
-            RunnableSequence: 役割分析チェーン
+            チャットモデルのインスタンス
+        """
+        key = (model_name, config.temperature, config.max_tokens)
+        with self._models_lock:
+            model = self._models.get(key)
+            if model is None:
+                model = self._models[key] = self.model_factory(model_name, config)
+            return model
+
+    @staticmethod
+    def _deadline(config: Optional[RunnableConfig]) -> Optional[Deadline]:
+        """Runnableの設定から期限を取り出す"""
+        return ((config or {}).get("configurable") or {}).get("deadline")
+
+    @staticmethod
+    def _request_options(stage_end: Optional[float]) -> Dict[str, Any]:
+        """
+        ステージの残り予算をモデルへのリクエストのタイムアウトに変換
+
+        期限切れで見捨てた呼び出しやヘッジで負けた呼び出しも、ステージの終了時刻には
+        モデル側で打ち切られ、ワーカーと接続を解放します。
+        """
+        if stage_end is None:
+            return {}
+        return {"timeout": max(0.001, stage_end - time.monotonic())}
+
+    @staticmethod
+    def _budget_exhausted(stage_end: Optional[float], error: Exception) -> bool:
+        """
+        呼び出しの失敗がステージの予算切れによるものかを判定
+
+        モデルに渡したリクエストのタイムアウトはステージの終了時刻と同じため、
+        タイムアウトや終了時刻を過ぎてからの失敗は代替モデルを試さずに期限切れとして扱います。
+        """
+        return stage_end is not None and (isinstance(error, TimeoutError) or time.monotonic() >= stage_end)
+
+    def _call_model(self, model: Any, prompt_value: Any, stage_end: Optional[float]) -> Any:
+        """ステージの残り予算をタイムアウトとしてモデルを呼び出す"""
+        return model.invoke(prompt_value, **self._request_options(stage_end))
+
+    def _invoke_stage(self, stage: str, prompt_value: Any, config: Optional[RunnableConfig] = None) -> Any:
+        """
+        ステージのモデルを呼び出す
+
+        ルーターが返す候補を順に試行し、各呼び出しのレイテンシと成否を記録します。
+        すべての候補が失敗した場合は最後の例外を送出します。
+        期限が指定されている場合、候補の試行はステージの予算内で行い、残り予算を
+        リクエストのタイムアウトとしてモデルに渡します。
+
+        Args:
+            stage (str): ステージ名
+            prompt_value: モデルに渡すプロンプト
+            config (Optional[RunnableConfig]): configurable["deadline"] に期限を含む実行設定
+
+        Returns:
+            モデルの応答メッセージ
+
+        Raises:
+            StageTimeoutError: ステージの予算内に応答が得られなかった場合
+        """
+        stage_config = self.stage_configs[stage]
+        deadline = self._deadline(config)
+        stage_end = None if deadline is None else time.monotonic() + deadline.stage_timeout(stage)
+        last_error: Optional[Exception] = None
+        for model_name in self.router.route(stage_config):
+            model = self._get_model(model_name, stage_config)
+            timeout = None if stage_end is None else stage_end - time.monotonic()
+            if timeout is not None and timeout <= 0:
+                raise StageTimeoutError(f"{stage}: ステージの予算を使い切りました") from last_error
+            try:
+                return self.hedger.call(
+                    model_name,
+                    partial(self._call_model, model, prompt_value, stage_end),
+                    timeout=timeout,
+                    stage=stage
+                )
+            except StageTimeoutError:
+                raise
+            except Exception as e:
+                if self._budget_exhausted(stage_end, e):
+                    raise StageTimeoutError(f"{stage}: ステージの予算を使い切りました") from e
+                logger.warning(f"{stage}: モデル {model_name} の呼び出しに失敗: {e}")
+                last_error = e
+        raise last_error
+
+    def _stream_stage(self, stage: str, prompt_value: Any, stage_end: Optional[float] = None) -> Iterator[Any]:
+        """
+        ステージのモデルをストリーミングで呼び出す
+
+        最初のチャンクを受信する前に失敗した場合のみ次の候補へフォールバックします。
+        呼び出し側がストリームを途中で閉じた場合も成功として記録します。
+
+        Args:
+            stage (str): ステージ名
+            prompt_value: モデルに渡すプロンプト
+            stage_end (Optional[float]): ステージの終了時刻（time.monotonic()基準、リクエストのタイムアウトに使用）
+
+        Yields:
+            モデルの応答チャンク
+        """
+        config = self.stage_configs[stage]
+        last_error: Optional[Exception] = None
+        for model_name in self.router.route(config):
+            model = self._get_model(model_name, config)
+            started = time.perf_counter()
+            try:
+                stream = iter(model.stream(prompt_value, **self._request_options(stage_end)))
+                first = next(stream)
+            except StopIteration:
+                self.router.record(model_name, time.perf_counter() - started)
+                return
+            except Exception as e:
+                self.router.record(model_name, time.perf_counter() - started, ok=False)
+                if self._budget_exhausted(stage_end, e):
+                    raise StageTimeoutError(f"{stage}: ステージの予算を使い切りました") from e
+                logger.warning(f"{stage}: モデル {model_name} のストリーミングに失敗: {e}")
+                last_error = e
+                continue
+            try:
+                yield first
+                yield from stream
+            except GeneratorExit:
+                self.router.record(model_name, time.perf_counter() - started)
+                raise
+            except Exception:
+                self.router.record(model_name, time.perf_counter() - started, ok=False)
+                raise
+            self.router.record(model_name, time.perf_counter() - started)
+            return
+        raise last_error
+
+    def _receive_stream(self, stage: str, prompt_value: Any, stage_end: Optional[float] = None) -> Iterator[Any]:
+        """
+        ステージのストリームをワーカースレッドで受信し、キュー経由で期限付きで取り出す
+
+        モデルのストリームは最初のチャンクを受信するまで制御を返さないため、受信ループの中で
+        期限を確認するだけでは最初のチャンクまでの停滞を打ち切れません。受信はワーカーが行い、
+        呼び出し側はステージの終了時刻までだけチャンクを待ちます。期限切れや途中で閉じた
+        場合は、ワーカーは次のチャンクを受信した時点、またはモデルへ渡したリクエストの
+        タイムアウトでストリームを閉じます。
+
+        Args:
+            stage (str): ステージ名
+            prompt_value: モデルに渡すプロンプト
+            stage_end (Optional[float]): ステージの終了時刻（time.monotonic()基準）
+
+        Yields:
+            モデルの応答チャンク
+
+        Raises:
+            StageTimeoutError: ステージの終了時刻までに次のチャンクが届かなかった場合
+        """
+        chunks: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+        stop = threading.Event()
+
+        def pump():
+            stream = self._stream_stage(stage, prompt_value, stage_end)
+            try:
+                for chunk in stream:
+                    chunks.put(("chunk", chunk))
+                    if stop.is_set():
+                        break
+                chunks.put(("end", None))
+            except Exception as e:
+                chunks.put(("error", e))
+            finally:
+                stream.close()
+
+        self._executor.submit(pump)
+        try:
+            while True:
+                try:
+                    kind, value = chunks.get(
+                        timeout=None if stage_end is None else max(0.0, stage_end - time.monotonic())
+                    )
+                except queue.Empty:
+                    raise StageTimeoutError(f"{stage}: ステージの予算を使い切りました") from None
+                if kind == "end":
+                    return
+                if kind == "error":
+                    raise value
+                yield value
+        finally:
+            stop.set()
+
+    def stage_llm(self, stage: str) -> RunnableLambda:
+        """
+        ステージ用のルーティング付きモデルをRunnableとして取得
+
+        Args:
+            stage (str): ステージ名（role_analysis / prompt_generation / validation）
+
+        Returns:
+            RunnableLambda: チェーンに組み込めるモデル呼び出し
+        """
+        if stage not in self.stage_configs:
+            raise ValueError(f"未知のステージです: {stage}")
+        return RunnableLambda(partial(self._invoke_stage, stage), name=f"{stage}_llm")
+
+    def create_role_analysis_prompt(self) -> PromptTemplate:
+        """
+        役割分析ステージのプロンプトテンプレートを作成
+
+        Returns:
+            PromptTemplate: 役割分析プロンプト
         """
         template = """
         ユーザーの入力から適切なエージェントの役割とツールを分析してください。
 
         入力: {user_input}
-
+        {tool_catalog}
         以下の要素を含めて出力してください：
         1. エージェントの役割と責任
         2. 必要なツール（各ツールには名前、説明、パラメータ、使用形式を含める）
@@ -114,13 +386,25 @@ class PromptChainBuilder:
         {format_instructions}
         """
         
-        prompt = PromptTemplate(
+        return PromptTemplate(
             template=template,
             input_variables=["user_input"],
-            partial_variables={"format_instructions": self.config_parser.get_format_instructions()}
+            partial_variables={
+                "format_instructions": self.config_parser.get_format_instructions(),
+                "tool_catalog": ""
+            }
         )
-        
-        return prompt | self.llm | self.config_parser
+
+    def create_role_analysis_chain(self) -> RunnableSequence:
+        """
+        役割分析チェーンを作成
+
+        ユーザー入力を分析し、エージェントの設定を生成します。
+
+        Returns:
+            RunnableSequence: 役割分析チェーン
+        """
+        return self.create_role_analysis_prompt() | self.stage_llm(ROLE_ANALYSIS) | self.config_parser
 
     def create_prompt_generation_chain(self) -> RunnableSequence:
         """
@@ -140,43 +424,43 @@ class PromptChainBuilder:
         以下の構造で出力してください：
 
         ```jinja2
-        {{{{ import 'macros/formatting.j2' as fmt }}}}
-        {{{{ import 'macros/tools.j2' as tools }}}}
-        {{{{ import 'macros/validation.j2' as validate }}}}
+        {{% import 'macros/formatting.j2' as fmt %}}
+        {{% import 'macros/tools.j2' as tools %}}
+        {{% import 'macros/validation.j2' as validate %}}
 
         {{# エージェント定義 #}}
         ◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢
-        # {{ role.name }}
-        Version: {{ version }}
+        # {{{{ role.name }}}}
+        Version: {{{{ version }}}}
 
         ## 基本原則
-        {{{{ for principle in role.principles }}}}
-        - {{ principle }}
-        {{{{ endfor }}}}
+        {{% for principle in role.principles %}}
+        - {{{{ principle }}}}
+        {{% endfor %}}
         ◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢◤◢
 
         ## システムロール
-        あなたは、{{ role.name }}として以下の責任を持ちます：
+        あなたは、{{{{ role.name }}}}として以下の責任を持ちます：
 
-        {{{{ for responsibility in role.responsibilities }}}}
-        - {{ responsibility }}
-        {{{{ endfor }}}}
+        {{% for responsibility in role.responsibilities %}}
+        - {{{{ responsibility }}}}
+        {{% endfor %}}
 
         ## 利用可能なツール
-        {{{{ for tool in tools }}}}
-        ### {{ tool.name }}
-        {{ tool.description }}
+        {{% for tool in tools %}}
+        ### {{{{ tool.name }}}}
+        {{{{ tool.description }}}}
         
         使用形式:
         ```
-        {{ tool.usage_format }}
+        {{{{ tool.usage_format }}}}
         ```
-        {{{{ endfor }}}}
+        {{% endfor %}}
 
         ## 制約条件
-        {{{{ for constraint in constraints }}}}
-        - {{ constraint }}
-        {{{{ endfor }}}}
+        {{% for constraint in constraints %}}
+        - {{{{ constraint }}}}
+        {{% endfor %}}
         ```
         """
         
@@ -185,7 +469,7 @@ class PromptChainBuilder:
             input_variables=["agent_config"]
         )
         
-        chain = prompt | self.llm
+        chain = prompt | self.stage_llm(PROMPT_GENERATION)
         return chain | RunnableLambda(lambda x: str(x.content if hasattr(x, 'content') else x))
 
     def create_validation_chain(self) -> RunnableSequence:
@@ -218,15 +502,103 @@ class PromptChainBuilder:
             input_variables=["agent_prompt"]
         )
         
-        chain = prompt | self.llm
+        chain = prompt | self.stage_llm(VALIDATION)
         return chain | RunnableLambda(lambda x: str(x.content if hasattr(x, 'content') else x))
 
-    def build_chain(self) -> RunnableSequence:
+    def _run_streaming(
+        self,
+        inputs: Dict[str, Any],
+        prompt_chain: RunnableSequence,
+        validation_chain: RunnableSequence,
+        config: Optional[RunnableConfig] = None
+    ) -> Dict[str, Any]:
+        """
+        役割分析をストリーミングで受信し、設定が閉じた時点で後続ステージを開始する
+
+        設定が閉じた時点で役割分析のストリームを閉じるため、残り（JSON以降の説明文など）の
+        生成と受信はクリティカルパスにもトークン消費にも含まれません。部分JSONの解析に
+        失敗した場合は全文を受信してから通常のパーサーで解析します。
+
+        短縮できた時間は受信しなかった残りの生成時間であり、この呼び出しの中では観測できません。
+        timingsには設定の解析までの時間、全体の時間、ストリームを途中で閉じたかどうかを返します。
+
+        ストリームはワーカースレッドで受信するため、期限が指定されている場合は最初のチャンクが
+        届く前の停滞もステージの予算で打ち切られます。ストリーミングはヘッジしません
+        （重複したストリームは両方の出力トークンを消費し、先に届いた最初のチャンクが
+        先に完了することを意味しないためです）。
+
+        Args:
+            inputs (Dict[str, Any]): 役割分析プロンプトの入力
+            prompt_chain: プロンプト生成チェーン
+            validation_chain: 検証チェーン
+            config (Optional[RunnableConfig]): configurable["deadline"] に期限を含む実行設定
+
+        Returns:
+            Dict[str, Any]: generate_promptの結果に "timings" を加えたもの
+        """
+        started = time.perf_counter()
+        deadline = self._deadline(config)
+        role_end = None if deadline is None else time.monotonic() + deadline.stage_timeout(ROLE_ANALYSIS)
+        prompt_value = self.create_role_analysis_prompt().invoke(inputs)
+        stream = self._receive_stream(ROLE_ANALYSIS, prompt_value, role_end)
+        parser: Optional[StreamingModelParser] = StreamingModelParser(AgentConfig)
+        received: List[str] = []
+        for chunk in stream:
+            text = str(chunk.content if hasattr(chunk, 'content') else chunk)
+            received.append(text)
+            if parser is None:
+                continue
+            try:
+                parser.feed(text)
+            except ValueError as e:
+                logger.warning(f"部分JSONの解析に失敗したため全文の受信を待ちます: {e}")
+                parser = None
+                continue
+            if parser.done:
+                stream.close()
+                break
+        parsed_at = time.perf_counter()
+        closed_early = parser is not None and parser.done
+
+        if closed_early:
+            agent_config = parser.result
+            agent_config_text = parser.rendered_config()
+        else:
+            agent_config = self.config_parser.parse("".join(received))
+            agent_config_text = str(agent_config)
+
+        def downstream() -> Tuple[str, str]:
+            agent_prompt = prompt_chain.invoke({"agent_config": agent_config_text}, config=config)
+            return agent_prompt, validation_chain.invoke({"agent_prompt": agent_prompt}, config=config)
+
+        future = self._executor.submit(downstream)
+        try:
+            agent_prompt, validation_result = future.result(
+                timeout=None if deadline is None else max(0.0, deadline.remaining())
+            )
+        except FutureTimeoutError:
+            raise StageTimeoutError(f"リクエストの期限（{deadline.timeout:.1f}秒）を過ぎました") from None
+        return {
+            "agent_config": agent_config,
+            "agent_prompt": agent_prompt,
+            "validation_result": validation_result,
+            "timings": {
+                "role_analysis_parsed": parsed_at - started,
+                "role_analysis_closed_early": closed_early,
+                "total": time.perf_counter() - started
+            }
+        }
+
+    def build_chain(self, stream: bool = False) -> RunnableSequence:
         """
         完全なプロンプトチェーンを構築
 
         3つのチェーンを組み合わせて完全なプロンプト生成パイプラインを作成します。
 
+        Args:
+            stream (bool): Trueの場合、役割分析をストリーミングで解析し、
+                設定のJSONが閉じた時点でプロンプト生成を開始する
+
         Returns:
             RunnableSequence: 完全なプロンプトチェーン
         """
@@ -234,10 +606,12 @@ class PromptChainBuilder:
         prompt_chain = self.create_prompt_generation_chain()
         validation_chain = self.create_validation_chain()
         
-        def combine_outputs(inputs: Dict[str, Any]) -> Dict[str, Any]:
-            agent_config = role_chain.invoke(inputs)
-            agent_prompt = prompt_chain.invoke({"agent_config": agent_config})
-            validation_result = validation_chain.invoke({"agent_prompt": agent_prompt})
+        def combine_outputs(inputs: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+            if stream:
+                return self._run_streaming(inputs, prompt_chain, validation_chain, config)
+            agent_config = role_chain.invoke(inputs, config=config)
+            agent_prompt = prompt_chain.invoke({"agent_config": agent_config}, config=config)
+            validation_result = validation_chain.invoke({"agent_prompt": agent_prompt}, config=config)
             return {
                 "agent_config": agent_config,
                 "agent_prompt": agent_prompt,
@@ -246,19 +620,68 @@ class PromptChainBuilder:
         
         return RunnableLambda(combine_outputs)
 
-    def generate_prompt(self, user_input: str) -> Dict[str, Any]:
+    @staticmethod
+    def format_tool_catalog(tools: Optional[List[Any]]) -> str:
+        """
+        役割分析プロンプトに埋め込むツール候補一覧を整形
+
+        Args:
+            tools (Optional[List[Any]]): ツール定義（Tool または dict）のリスト
+
+        Returns:
+            str: ツール候補の一覧（ツールがない場合は空文字列）
+        """
+        if not tools:
+            return ""
+        lines = ["", "利用可能なツール候補（必要なものを選んで使用してください）:"]
+        for tool in tools:
+            name = tool["name"] if isinstance(tool, dict) else tool.name
+            description = tool["description"] if isinstance(tool, dict) else tool.description
+            lines.append(f"- {name}: {description}")
+        return "\n        ".join(lines) + "\n"
+
+    def generate_prompt(
+        self,
+        user_input: str,
+        profile: Optional[bool] = None,
+        tools: Optional[List[Any]] = None,
+        stream: bool = False,
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
         プロンプトの生成と検証を実行
 
         Args:
             user_input (str): ユーザーからの入力テキスト
+            profile (Optional[bool]): Trueでこの呼び出しをプロファイル（Noneの場合は環境変数HAYASHI_PROFILEに従う）
+            tools (Optional[List[Any]]): 役割分析に候補として渡すツール（ToolIndex.selectで絞り込んだもの）
+            stream (bool): Trueの場合、役割分析のJSONが閉じた時点でプロンプト生成を開始する
+            deadline (Optional[float]): 全体の期限（秒）。各ステージの deadline_share に従って分割される
 
         Returns:
             Dict[str, Any]: {
                 "agent_config": AgentConfig,
                 "agent_prompt": str,
-                "validation_result": str
+                "validation_result": str,
+                "timings": Dict[str, Any]（stream=Trueの場合のみ）
             }
+
+            timings には次の値が入ります。役割分析のストリームは閉じた時点で打ち切られるため、
+            最後まで受信した場合との差（短縮できた秒数）は測定・推定しません。
+                "role_analysis_parsed": 役割分析のJSONを解析し終えるまでの秒数
+                "role_analysis_closed_early": JSONが閉じた時点でストリームを打ち切ったか（bool）
+                "total": 全体の秒数
+
+        Raises:
+            StageTimeoutError: 期限内にいずれかのステージが完了しなかった場合
         """
-        chain = self.build_chain()
-        return chain.invoke({"user_input": user_input})
\ No newline at end of file
+        with profile_section("generate_prompt", enabled=profile):
+            chain = self.build_chain(stream=stream)
+            config: RunnableConfig = {}
+            if deadline is not None:
+                shares = {stage: stage_config.deadline_share for stage, stage_config in self.stage_configs.items()}
+                config["configurable"] = {"deadline": Deadline(deadline, shares)}
+            return chain.invoke({
+                "user_input": user_input,
+                "tool_catalog": self.format_tool_catalog(tools)
+            }, config=config)
\ No newline at end of file
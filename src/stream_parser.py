@@ -0,0 +1,184 @@
+"""
+ストリーミング部分JSONパーサー
+
+このモジュールは、役割分析ステージの応答をストリーミングで受け取りながら
+AgentConfigなどのPydanticモデルのJSONを逐次解析するパーサーを提供します。トップレベルのフィールドは
+値が閉じた時点で個別に検証され、オブジェクト全体が閉じた時点で完成した
+AgentConfigが得られます。それ以降に続く説明文などを待つ必要はありません。
+
+各フィールドは検証と同時に次ステージ用の文字列（str(AgentConfig) と同じ形式）へ
+先行レンダリングされるため、オブジェクトが閉じた直後にプロンプト生成ステージへ
+入力を渡せます。
+
+使用例:
+    >>> parser = StreamingModelParser(AgentConfig)
+    >>> for chunk in llm.stream(prompt):
+    ...     parser.feed(chunk.content)
+    ...     if parser.done:
+    ...         break
+    >>> parser.result
+    AgentConfig(role_name=..., ...)
+"""
+
+from pydantic import BaseModel, TypeAdapter
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+import json
+
+_KEY = "key"
+_COLON = "colon"
+_VALUE = "value"
+
+# フィールド検証用のTypeAdapterはモデルとフィールドごとに一度だけ構築する
+_adapters: Dict[Tuple[Type[BaseModel], str], TypeAdapter] = {}
+
+class StreamingModelParser:
+    """
+    トップレベルのフィールド単位でJSONを逐次解析・検証するパーサー
+
+    JSONオブジェクトより前のテキスト（```json などの前置き）は読み飛ばします。
+    ネストしたオブジェクトや配列は値が閉じるまでまとめて扱います。
+
+    Attributes:
+        model (Type[BaseModel]): 解析対象のPydanticモデル
+        fields (Dict[str, Any]): 受信済みフィールドの検証済みの値
+        rendered (Dict[str, str]): フィールドごとの先行レンダリング結果（"name=値のrepr"）
+        result (Optional[BaseModel]): オブジェクトが閉じた後の完成したモデル
+        trailing (str): オブジェクトが閉じた後に受信したテキスト
+    """
+
+    def __init__(
+        self,
+        model: Type[BaseModel],
+        on_field: Optional[Callable[[str, Any], None]] = None
+    ):
+        """
+        Args:
+            model (Type[BaseModel]): 解析対象のPydanticモデル
+            on_field: フィールドが検証されるたびに (名前, 値) で呼ばれるコールバック
+        """
+        self.model = model
+        self.on_field = on_field
+        self.fields: Dict[str, Any] = {}
+        self.rendered: Dict[str, str] = {}
+        self.result: Optional[BaseModel] = None
+        self.trailing = ""
+        self._raw: Dict[str, Any] = {}
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._state = _KEY
+        self._key: Optional[str] = None
+        self._key_start = 0
+        self._value_start = 0
+
+    @property
+    def done(self) -> bool:
+        """トップレベルのオブジェクトが閉じたかどうか"""
+        return self.result is not None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        受信したテキストを解析
+
+        Args:
+            chunk (str): 新たに受信したテキスト
+
+        Returns:
+            List[Tuple[str, Any]]: このチャンクで確定したフィールドの (名前, 検証済みの値)
+
+        Raises:
+            pydantic.ValidationError: フィールドまたは完成したモデルの検証に失敗した場合
+            json.JSONDecodeError: フィールドの値が不正なJSONの場合
+        """
+        if self.done:
+            self.trailing += chunk
+            return []
+        self._text += chunk
+        completed: List[Tuple[str, Any]] = []
+        text = self._text
+        for index in range(self._pos, len(text)):
+            char = text[index]
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._state == _KEY:
+                        self._key = json.loads(text[self._key_start:index + 1])
+                        self._state = _COLON
+                continue
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._state == _KEY:
+                    self._key_start = index
+                continue
+            if self._depth == 1:
+                if char == ":" and self._state == _COLON:
+                    self._state = _VALUE
+                    self._value_start = index + 1
+                    continue
+                if char in ",}":
+                    if self._state == _VALUE:
+                        completed.append(self._complete_field(text[self._value_start:index]))
+                    self._state = _KEY
+                    if char == "}":
+                        self._finish(text[index + 1:])
+                        break
+                    continue
+            if char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+        else:
+            self._pos = len(text)
+        return completed
+
+    def _complete_field(self, raw: str) -> Tuple[str, Any]:
+        """値が閉じたフィールドを検証し、先行レンダリングする"""
+        name = self._key
+        value = json.loads(raw)
+        self._raw[name] = value
+        field = self.model.model_fields.get(name)
+        if field is not None:
+            adapter = _adapters.get((self.model, name))
+            if adapter is None:
+                adapter = _adapters[(self.model, name)] = TypeAdapter(field.annotation)
+            value = adapter.validate_python(value)
+            if field.repr:
+                self.rendered[name] = f"{name}={value!r}"
+        self.fields[name] = value
+        if self.on_field:
+            self.on_field(name, value)
+        return name, value
+
+    def _finish(self, trailing: str):
+        """オブジェクト全体を検証して完成させる"""
+        self.result = self.model.model_validate(self._raw)
+        self.trailing = trailing
+        self._text = ""
+
+    def rendered_config(self) -> str:
+        """
+        次ステージに渡す設定文字列を取得
+
+        先行レンダリング済みのフィールドを連結したもので、str(result) と同じ文字列になります。
+
+        Returns:
+            str: 設定文字列
+        """
+        if self.result is None:
+            raise ValueError("オブジェクトがまだ完成していません")
+        names = [name for name, field in self.model.model_fields.items() if field.repr]
+        if all(name in self.rendered for name in names):
+            return " ".join(self.rendered[name] for name in names)
+        return str(self.result)
@@ -0,0 +1,497 @@
+"""
+生成テンプレートのサンドボックスレンダラー
+
+このモジュールは、プロンプト生成ステージが返すJinja2テンプレート（agent_prompt）を
+ImmutableSandboxedEnvironmentでコンパイル・レンダリングするレンダラーを提供します。
+テンプレートはLLMが生成した信頼できないコードとして扱い、属性アクセスや
+呼び出しはサンドボックスで制限されます。
+
+テンプレート内の {% import 'macros/formatting.j2' as fmt %} などは
+テンプレートディレクトリから解決されます。
+
+コンパイル済みテンプレートはソースのハッシュをキーとするLRUキャッシュに保持されるため、
+同じテンプレートを繰り返しレンダリングする場合は構文解析とコンパイルが省略されます。
+
+リソース制限:
+    サンドボックスは属性アクセスを制限しますが、計算量やメモリは制限しません。
+    LimitedSandboxedEnvironment は次の制限を加え、超えた場合はRenderLimitErrorを送出します。
+    - 出力の文字数（max_output_size）
+    - 連結（+・~）、繰り返し（*）、書式（%・format・center・indent）、replace・join・wordwrap の
+      結果の大きさ（評価前に見積もります）
+    - 演算・フィルター・関数呼び出しの結果と、namespace に代入する値の大きさ
+    - 整数の乗算・べき乗の結果のビット数と、関数呼び出しに渡す整数の大きさ（lipsum は無効化）
+    - レンダリング時間（render_timeout）
+    リスト・辞書をその場で変更するメソッド（append など）は使えません。大きさは値ごとに
+    確認するため、上限未満の値を多数作るテンプレートはメモリを上限の何倍も使うことがあります。
+    時間はrange・関数呼び出し・属性アクセス・演算・出力のたびに確認するため、それらを含まない
+    ループ（既存のリストに対する空のループなど）は途中で打ち切られません。range は1回あたり
+    100,000件までです。メモリと時間を確実に制限する必要がある場合は、RLIMIT_AS などを設定した
+    別プロセスでレンダリングしてください。
+
+使用例:
+    >>> from template_renderer import GeneratedTemplateRenderer, context_from_config
+    >>> renderer = GeneratedTemplateRenderer("templates")
+    >>> result = builder.generate_prompt(user_input)
+    >>> context = context_from_config(result["agent_config"])
+    >>> prompt = renderer.render(result["agent_prompt"], context)
+    >>> prompts = renderer.render_many(result["agent_prompt"], contexts)
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from jinja2 import FileSystemLoader, StrictUndefined, Template, nodes
+from jinja2.compiler import CodeGenerator, Frame, optimizeconst
+from jinja2.runtime import markup_join, str_join
+from jinja2.sandbox import ImmutableSandboxedEnvironment, SecurityError, inspect_format_method, safe_range
+from jinja2.utils import Namespace, _PassArg
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import functools
+import hashlib
+import re
+import threading
+import time
+
+# LLMの応答に含まれる ```jinja2 ... ``` のコードフェンス（言語名は任意）
+_FENCE_PATTERN = re.compile(r"^[ \t]*```[ \t]*([\w+-]*)[ \t]*\n(.*?)\n?[ \t]*```", re.DOTALL | re.MULTILINE)
+_TEMPLATE_LANGUAGES = ("jinja", "jinja2", "j2")
+
+# printf形式（%10s）と str.format形式（{:>10}）の幅・精度
+_PRINTF_WIDTH_PATTERN = re.compile(r"%[-#0 +]*(\d*)(?:\.(\d+))?")
+_FORMAT_WIDTH_PATTERN = re.compile(r"\{[^{}]*:[^{}]*?(\d+)[^{}]*\}")
+
+class RenderLimitError(SecurityError):
+    """レンダリングがリソース制限（出力サイズ・演算の規模・時間）を超えたことを示す例外"""
+
+def _estimated_size(value: Any, limit: int) -> int:
+    """値の要素数と文字数のおおよその合計（limitを超えた時点で打ち切る）"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        items: Iterable[Any] = value.items()
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = value
+    else:
+        return 1
+    total = 0
+    for item in items:
+        total += _estimated_size(item, limit - total) + 1
+        if total > limit:
+            break
+    return total
+
+class _LimitedCodeGenerator(CodeGenerator):
+    """連結（~）を environment.call_concat 経由で評価するコードジェネレーター"""
+
+    @optimizeconst
+    def visit_Concat(self, node: nodes.Concat, frame: Frame) -> None:
+        self.write("environment.call_concat(context, (")
+        for arg in node.nodes:
+            self.visit(arg, frame)
+            self.write(", ")
+        self.write("))")
+
+class LimitedSandboxedEnvironment(ImmutableSandboxedEnvironment):
+    """
+    出力サイズ・演算の規模・レンダリング時間を制限したサンドボックス環境
+
+    制限はレンダリングごとに limits() の中で有効になります。リスト・辞書を
+    その場で変更するメソッド（append・update など）は使えません。
+
+    Attributes:
+        max_output_size (int): 出力と、演算・連結・フィルター・呼び出し・namespace への代入で
+            作られる値の最大の大きさ（文字数・要素数）
+        render_timeout (Optional[float]): 1回のレンダリングの最大時間（秒、Noneで無制限）
+        max_power_bits (int): 整数の乗算・べき乗の結果の最大ビット数
+    """
+    intercepted_binops = frozenset(["+", "*", "**", "%"])
+    code_generator_class = _LimitedCodeGenerator
+
+    def __init__(
+        self,
+        *args: Any,
+        max_output_size: int = 1_000_000,
+        render_timeout: Optional[float] = 2.0,
+        max_power_bits: int = 65536,
+        **kwargs: Any
+    ):
+        super().__init__(*args, **kwargs)
+        self.max_output_size = max_output_size
+        self.render_timeout = render_timeout
+        self.max_power_bits = max_power_bits
+        self._state = threading.local()
+        self.globals["range"] = self._range
+        self.globals["namespace"] = self._namespace_class()
+        self.globals.pop("lipsum", None)
+        checks = {
+            "center": self._check_args,
+            "indent": self._check_indent,
+            "format": self._check_format_filter,
+            "replace": self._check_replace,
+            "join": self._check_join,
+            "wordwrap": self._check_wordwrap
+        }
+        for name, fn in list(self.filters.items()):
+            self.filters[name] = self._limited_filter(fn, checks.get(name, self._check_args))
+
+    @contextmanager
+    def limits(self) -> Iterator[None]:
+        """このスレッドでのレンダリングにタイムアウトを設定する"""
+        previous = getattr(self._state, "expires_at", None)
+        self._state.expires_at = None if self.render_timeout is None else time.monotonic() + self.render_timeout
+        try:
+            yield
+        finally:
+            self._state.expires_at = previous
+
+    def check_time(self):
+        """レンダリングの時間が上限を超えていればRenderLimitErrorを送出する"""
+        expires_at = getattr(self._state, "expires_at", None)
+        if expires_at is not None and time.monotonic() > expires_at:
+            raise RenderLimitError(f"レンダリングが{self.render_timeout}秒を超えました")
+
+    def check_size(self, size: int, what: str):
+        """大きさが上限を超えていればRenderLimitErrorを送出する"""
+        if size > self.max_output_size:
+            raise RenderLimitError(f"{what}の大きさ（{size}）が上限（{self.max_output_size}）を超えます")
+
+    def check_value(self, value: Any, what: str) -> Any:
+        """
+        値の大きさ（整数はビット数）が上限を超えていればRenderLimitErrorを送出する
+
+        Args:
+            value: 確認する値
+            what (str): エラーメッセージに使う値の説明
+
+        Returns:
+            Any: 確認した値
+        """
+        if isinstance(value, int) and not isinstance(value, bool):
+            if value.bit_length() > self.max_power_bits:
+                raise RenderLimitError(f"{what}が{self.max_power_bits}ビットを超えます")
+        else:
+            self.check_size(_estimated_size(value, self.max_output_size), what)
+        return value
+
+    def call_concat(self, context: Any, values: Iterable[Any]) -> str:
+        """
+        連結（~）を大きさを確認してから評価する
+
+        Args:
+            context: テンプレートのコンテキスト
+            values: 連結する値
+
+        Returns:
+            str: 連結した文字列
+        """
+        self.check_time()
+        values = list(values)
+        self.check_size(sum(len(value) if isinstance(value, str) else len(str(value)) for value in values), "連結の結果")
+        if context.eval_ctx.autoescape:
+            return markup_join(values)
+        return str_join(values)
+
+    def _namespace_class(self) -> type:
+        environment = self
+
+        class LimitedNamespace(Namespace):
+            """代入する値の大きさを確認する namespace"""
+
+            def __setitem__(self, name: str, value: Any):
+                environment.check_time()
+                super().__setitem__(name, environment.check_value(value, "namespaceの値"))
+
+        return LimitedNamespace
+
+    def _check_args(self, args: Iterable[Any], kwargs: Dict[str, Any]):
+        for value in (*args, *kwargs.values()):
+            if isinstance(value, int) and not isinstance(value, bool):
+                self.check_size(abs(value), "引数")
+
+    def _check_format(self, fmt: str, pattern: "re.Pattern[str]", args: Iterable[Any] = ()):
+        for match in pattern.finditer(fmt):
+            for width in match.groups():
+                if width:
+                    self.check_size(int(width), "書式の幅")
+        largest = max((_estimated_size(arg, self.max_output_size) for arg in args), default=0)
+        self.check_size(len(fmt) + (fmt.count("%") + fmt.count("{")) * largest, "書式の結果")
+
+    def _check_indent(self, args: Iterable[Any], kwargs: Dict[str, Any]):
+        args = list(args)
+        width = kwargs.get("width", args[1] if len(args) > 1 else 4)
+        if isinstance(width, str):
+            self.check_size(len(args[0]) + (str(args[0]).count("\n") + 1) * len(width), "indentの結果")
+        self._check_args(args, kwargs)
+
+    def _check_format_filter(self, args: Iterable[Any], kwargs: Dict[str, Any]):
+        args = list(args)
+        if args and isinstance(args[0], str):
+            self._check_format(args[0], _PRINTF_WIDTH_PATTERN, [*args[1:], *kwargs.values()])
+
+    def _check_replace(self, args: Iterable[Any], kwargs: Dict[str, Any]):
+        args = [*args, *kwargs.values()]
+        if len(args) >= 3 and all(isinstance(arg, str) for arg in args[:3]):
+            text, old, new = args[:3]
+            count = text.count(old) if old else len(text) + 1
+            if len(args) > 3 and isinstance(args[3], int) and args[3] >= 0:
+                count = min(count, args[3])
+            self.check_size(len(text) + count * (len(new) - len(old)), "置換の結果")
+
+    def _check_join(self, args: Iterable[Any], kwargs: Dict[str, Any]):
+        args = list(args)
+        separator = kwargs.get("d", args[1] if len(args) > 1 else "")
+        if args and isinstance(args[0], (list, tuple)) and isinstance(separator, str):
+            items = args[0]
+            self.check_size(_estimated_size(items, self.max_output_size) + len(items) * len(separator), "連結の結果")
+
+    def _check_wordwrap(self, args: Iterable[Any], kwargs: Dict[str, Any]):
+        args = list(args)
+        width = kwargs.get("width", args[1] if len(args) > 1 else 79)
+        wrapstring = kwargs.get("wrapstring", args[3] if len(args) > 3 else None) or "\n"
+        if args and isinstance(args[0], str) and isinstance(width, int) and isinstance(wrapstring, str):
+            text = args[0]
+            self.check_size(len(text) + (len(text) // max(width, 1) + 1) * len(wrapstring), "wordwrapの結果")
+
+    def _limited_filter(self, fn: Any, check: Any) -> Any:
+        skip = 1 if _PassArg.from_obj(fn) is not None else 0
+
+        @functools.wraps(fn)
+        def limited(*args: Any, **kwargs: Any) -> Any:
+            self.check_time()
+            if check == self._check_join and len(args) > skip and not isinstance(args[skip], str):
+                args = (*args[:skip], list(args[skip]), *args[skip + 1:])
+            check(args[skip:], kwargs)
+            return self.check_value(fn(*args, **kwargs), "フィルターの結果")
+        return limited
+
+    def _range(self, *args: int) -> range:
+        self.check_time()
+        return safe_range(*args)
+
+    def call_binop(self, context: Any, operator: str, left: Any, right: Any) -> Any:
+        self.check_time()
+        if operator == "+":
+            if not isinstance(left, (int, float)) and not isinstance(right, (int, float)):
+                self.check_size(_estimated_size(left, self.max_output_size) + _estimated_size(right, self.max_output_size), "連結の結果")
+        elif operator == "*":
+            if isinstance(left, int) and isinstance(right, int):
+                if left.bit_length() + right.bit_length() > self.max_power_bits:
+                    raise RenderLimitError(f"乗算の結果が{self.max_power_bits}ビットを超えます")
+            for sequence, count in ((left, right), (right, left)):
+                if isinstance(count, int) and not isinstance(sequence, (int, float)):
+                    self.check_size(_estimated_size(sequence, self.max_output_size) * count, "繰り返しの結果")
+        elif operator == "**":
+            if isinstance(left, int) and isinstance(right, int) and right > 0:
+                if max(abs(left).bit_length(), 1) * right > self.max_power_bits:
+                    raise RenderLimitError(f"べき乗の結果が{self.max_power_bits}ビットを超えます")
+        elif operator == "%" and isinstance(left, str):
+            self._check_format(left, _PRINTF_WIDTH_PATTERN, right if isinstance(right, tuple) else [right])
+        return self.check_value(super().call_binop(context, operator, left, right), "演算の結果")
+
+    def call(__self, __context: Any, __obj: Any, *args: Any, **kwargs: Any) -> Any:  # noqa: B902
+        __self.check_time()
+        __self._check_args(args, kwargs)
+        fmt = inspect_format_method(__obj)
+        if fmt is not None:
+            __self._check_format(fmt, _FORMAT_WIDTH_PATTERN, [*args, *kwargs.values()])
+        elif isinstance(getattr(__obj, "__self__", None), str) and args:
+            if __obj.__name__ == "replace":
+                __self._check_replace([__obj.__self__, *args], kwargs)
+            elif __obj.__name__ == "join":
+                args = (list(args[0]), *args[1:])
+                __self._check_join([args[0], __obj.__self__], {})
+        return __self.check_value(super().call(__context, __obj, *args, **kwargs), "呼び出しの結果")
+
+    def getattr(self, obj: Any, attribute: str) -> Any:
+        self.check_time()
+        return super().getattr(obj, attribute)
+
+    def getitem(self, obj: Any, argument: Any) -> Any:
+        self.check_time()
+        return super().getitem(obj, argument)
+
+def extract_template(agent_prompt: str) -> str:
+    """
+    生成ステージの応答からテンプレート本体を取り出す
+
+    応答の中で最初の ```jinja2（または ```j2）のコードフェンスの中身を返します。
+    それがなければ最初のコードフェンスの中身を、コードフェンスがなければ応答をそのまま返します。
+    フェンスの前後の説明文は取り除かれます。
+
+    Args:
+        agent_prompt (str): プロンプト生成ステージの応答
+
+    Returns:
+        str: テンプレートのソース
+    """
+    text = str(agent_prompt).strip()
+    blocks = [match.groups() for match in _FENCE_PATTERN.finditer(text)]
+    for language, body in blocks:
+        if language.lower() in _TEMPLATE_LANGUAGES:
+            return body
+    if blocks:
+        return blocks[0][1]
+    return text
+
+def context_from_config(agent_config: Any, version: str = "1.0.0") -> Dict[str, Any]:
+    """
+    AgentConfigから生成テンプレート用のコンテキストを作成
+
+    生成ステージに指示しているテンプレート変数（role, tools, constraints, version）に対応します。
+
+    Args:
+        agent_config: AgentConfig、またはそれと同じ構造の辞書
+        version (str): テンプレートに埋め込むバージョン
+
+    Returns:
+        Dict[str, Any]: レンダリング用のコンテキスト
+    """
+    config = agent_config.model_dump() if hasattr(agent_config, "model_dump") else dict(agent_config)
+    return {
+        "role": {
+            "name": config["role_name"],
+            "principles": config["principles"],
+            "responsibilities": config["responsibilities"]
+        },
+        "tools": config["tools"],
+        "constraints": config["constraints"],
+        "version": version
+    }
+
+class GeneratedTemplateRenderer:
+    """
+    LLMが生成したテンプレートを安全にコンパイル・レンダリングするレンダラー
+
+    Attributes:
+        env (LimitedSandboxedEnvironment): マクロを解決するリソース制限付きのサンドボックス環境
+        cache_size (int): キャッシュするコンパイル済みテンプレートの最大数
+        hits (int): キャッシュヒット数
+        misses (int): キャッシュミス（コンパイル）数
+    """
+
+    def __init__(
+        self,
+        templates_path: str = "templates",
+        cache_size: int = 128,
+        strict: bool = False,
+        max_output_size: int = 1_000_000,
+        render_timeout: Optional[float] = 2.0
+    ):
+        """
+        Args:
+            templates_path (str): macros/*.j2 を含むテンプレートディレクトリ
+            cache_size (int): キャッシュするコンパイル済みテンプレートの最大数
+            strict (bool): 未定義の変数をエラーにするかどうか
+            max_output_size (int): 1回のレンダリング結果と、演算・連結などで作られる個々の値の最大の大きさ（文字数）
+            render_timeout (Optional[float]): 1回のレンダリングの最大時間（秒、Noneで無制限）
+        """
+        options = {"undefined": StrictUndefined} if strict else {}
+        self.env = LimitedSandboxedEnvironment(
+            loader=FileSystemLoader(templates_path),
+            trim_blocks=True,
+            lstrip_blocks=True,
+            auto_reload=False,
+            max_output_size=max_output_size,
+            render_timeout=render_timeout,
+            **options
+        )
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, Template]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def source_key(source: str) -> str:
+        """テンプレートソースのキャッシュキー（SHA-256）"""
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    def compile(self, agent_prompt: str) -> Template:
+        """
+        テンプレートをコンパイル（キャッシュ済みの場合は再利用）
+
+        Args:
+            agent_prompt (str): テンプレート、またはコードフェンスで囲まれた生成ステージの応答
+
+        Returns:
+            Template: コンパイル済みテンプレート
+
+        Raises:
+            jinja2.TemplateSyntaxError: テンプレートの構文が不正な場合
+        """
+        source = extract_template(agent_prompt)
+        key = self.source_key(source)
+        with self._lock:
+            template = self._cache.get(key)
+            if template is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return template
+        # コンパイルはロックの外で行い、他のテンプレートのレンダリングを止めない
+        template = self.env.from_string(source)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = template
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return template
+
+    def render(self, agent_prompt: str, context: Dict[str, Any]) -> str:
+        """
+        テンプレートをレンダリング
+
+        Args:
+            agent_prompt (str): テンプレート、またはコードフェンスで囲まれた生成ステージの応答
+            context (Dict[str, Any]): テンプレート変数
+
+        Returns:
+            str: レンダリング結果
+
+        Raises:
+            jinja2.sandbox.SecurityError: テンプレートが安全でない操作を行った場合
+            RenderLimitError: 出力サイズ・演算の規模・レンダリング時間の上限を超えた場合
+        """
+        return self._render(self.compile(agent_prompt), context)
+
+    def _render(self, template: Template, context: Dict[str, Any]) -> str:
+        """リソース制限の中でレンダリングし、出力の文字数を確認しながら連結する"""
+        parts: List[str] = []
+        size = 0
+        with self.env.limits():
+            for part in template.generate(context):
+                size += len(part)
+                self.env.check_size(size, "出力")
+                self.env.check_time()
+                parts.append(part)
+        return "".join(parts)
+
+    def render_many(self, agent_prompt: str, contexts: Iterable[Dict[str, Any]]) -> List[str]:
+        """
+        同じテンプレートを複数のコンテキストでレンダリング
+
+        テンプレートの取得は1回だけ行います。
+
+        Args:
+            agent_prompt (str): テンプレート、またはコードフェンスで囲まれた生成ステージの応答
+            contexts (Iterable[Dict[str, Any]]): テンプレート変数のリスト
+
+        Returns:
+            List[str]: コンテキストごとのレンダリング結果
+        """
+        template = self.compile(agent_prompt)
+        return [self._render(template, context) for context in contexts]
+
+    def cache_info(self) -> Dict[str, int]:
+        """
+        キャッシュの統計を取得
+
+        Returns:
+            Dict[str, int]: hits, misses, size, max_size
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._cache),
+                "max_size": self.cache_size
+            }
@@ -0,0 +1,120 @@
+"""
+カセット（記録・再生）レイヤーのテストスイート
+
+疑似チャットモデルを記録対象として、以下を検証します：
+1. 記録した応答が再生されること
+2. プロンプトの空白の違いが同じカセットに対応すること
+3. 未記録の呼び出しが再生モードでエラーになること
+4. 別のモデルで記録したカセットが再生されないこと
+5. 記録時のレイテンシを再現できること
+6. カセットだけで完全なチェーンが実行できること
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from cassette import CassetteChatModel, CassetteMissError, cassette_model_factory, load_cassettes
+from fake_llm import FakeChatModel
+from prompt_chain import PromptChainBuilder, AgentConfig
+
+class TestCassette(unittest.TestCase):
+    """CassetteChatModelのテストケース集"""
+
+    def setUp(self):
+        self.cassette_dir = tempfile.mkdtemp()
+        self.inner = FakeChatModel(responder=lambda prompt: f"応答: {prompt.strip()}", latency=0.05)
+
+    def tearDown(self):
+        shutil.rmtree(self.cassette_dir)
+
+    def test_record_then_replay(self):
+        """
+        記録と再生のテスト
+
+        記録した応答が内側のモデルを呼び出さずに再生されることを検証します。
+        """
+        recorder = CassetteChatModel(cassette_dir=self.cassette_dir, mode="record", inner=self.inner)
+        recorded = recorder.invoke("タスク管理エージェント").content
+
+        player = CassetteChatModel(cassette_dir=self.cassette_dir, mode="replay")
+        self.assertEqual(player.invoke("  タスク管理エージェント ").content, recorded)
+        self.assertEqual(self.inner.call_count, 1)
+        self.assertEqual(len(load_cassettes(self.cassette_dir)), 1)
+
+    def test_whitespace_is_normalized(self):
+        """
+        プロンプト正規化のテスト
+
+        インデントや改行の違いが同じカセットに対応することを検証します。
+        """
+        recorder = CassetteChatModel(cassette_dir=self.cassette_dir, mode="record", inner=self.inner)
+        recorder.invoke("役割分析\n    入力: テスト")
+
+        player = CassetteChatModel(cassette_dir=self.cassette_dir, mode="replay")
+        self.assertTrue(player.invoke("役割分析 入力:   テスト").content.startswith("応答"))
+
+    def test_replay_miss_raises(self):
+        """
+        未記録呼び出しのテスト
+
+        再生モードで未記録のプロンプトを呼び出すとCassetteMissErrorになることを検証します。
+        """
+        player = CassetteChatModel(cassette_dir=self.cassette_dir, mode="replay")
+        with self.assertRaises(CassetteMissError):
+            player.invoke("未記録のプロンプト")
+
+    def test_model_name_is_part_of_key(self):
+        """
+        モデル別のキーのテスト
+
+        同じプロンプトでも、別のモデル名で記録したカセットは再生されないことを検証します。
+        """
+        CassetteChatModel(
+            cassette_dir=self.cassette_dir, mode="record", inner=self.inner, model_name="claude-3-haiku-20240307"
+        ).invoke("役割分析")
+
+        player = CassetteChatModel(cassette_dir=self.cassette_dir, mode="replay", model_name="claude-3-5-sonnet-20241022")
+        with self.assertRaises(CassetteMissError):
+            player.invoke("役割分析")
+
+    def test_recorded_latency_is_simulated(self):
+        """
+        レイテンシ再現のテスト
+
+        latency="recorded" の場合に記録時と同程度の遅延で再生されることを検証します。
+        """
+        CassetteChatModel(cassette_dir=self.cassette_dir, mode="record", inner=self.inner).invoke("遅延テスト")
+
+        player = CassetteChatModel(cassette_dir=self.cassette_dir, mode="replay", latency="recorded")
+        started = time.perf_counter()
+        player.invoke("遅延テスト")
+        self.assertGreaterEqual(time.perf_counter() - started, 0.04)
+
+    def test_complete_chain_offline(self):
+        """
+        完全なチェーンの再生テスト
+
+        疑似モデルで記録したカセットだけで generate_prompt が同じ結果を返すことを検証します。
+        """
+        recording = PromptChainBuilder(
+            model_factory=cassette_model_factory(
+                self.cassette_dir,
+                mode="record",
+                base_factory=lambda model_name, config: FakeChatModel(model_name=model_name)
+            )
+        )
+        recorded = recording.generate_prompt("コードレビューを支援するエージェント")
+
+        replaying = PromptChainBuilder(model_factory=cassette_model_factory(self.cassette_dir, mode="replay"))
+        replayed = replaying.generate_prompt("コードレビューを支援するエージェント")
+
+        self.assertIsInstance(replayed["agent_config"], AgentConfig)
+        self.assertEqual(replayed["agent_config"], recorded["agent_config"])
+        self.assertEqual(replayed["agent_prompt"], recorded["agent_prompt"])
+        self.assertEqual(replayed["validation_result"], recorded["validation_result"])
+        self.assertEqual(len(os.listdir(self.cassette_dir)), 3)
+
+if __name__ == '__main__':
+    unittest.main()
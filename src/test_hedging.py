@@ -0,0 +1,163 @@
+"""
+期限とヘッジ呼び出しのテストスイート
+
+裾の重いレイテンシ分布を持つ疑似チャットモデルを使用して、以下を検証します：
+1. 全体の期限がステージの配分比率に従って分割されること
+2. ヘッジ呼び出しによって裾のレイテンシが短縮され、ヘッジの比率が上限内に収まること
+3. ヘッジの待ち時間がステージとモデルの組み合わせごとの統計で決まること
+4. 期限を過ぎたステージがStageTimeoutErrorになり、見捨てた呼び出しもモデル側で打ち切られること
+5. ストリーミングでも最初のチャンクまでの停滞が期限で打ち切られること
+6. 期限内に終わる場合は通常どおり結果が得られること
+"""
+
+import time
+import unittest
+from fake_llm import FakeChatModel, heavy_tailed_latency
+from hedging import Deadline, Hedger, StageTimeoutError
+from model_router import ModelRouter
+from prompt_chain import PromptChainBuilder, AgentConfig
+
+def run_calls(hedger, model, count):
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        hedger.call(model.model_name, lambda: model.invoke("テスト"))
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+def tail_mean(latencies, fraction=0.02):
+    slowest = sorted(latencies)[-max(1, int(len(latencies) * fraction)):]
+    return sum(slowest) / len(slowest)
+
+class TestDeadline(unittest.TestCase):
+    """Deadlineのテストケース集"""
+
+    def test_budget_is_split_by_share(self):
+        """
+        予算分割のテスト
+
+        各ステージの予算が開始時点の残り時間を未開始のステージで按分したものになり、
+        同じステージの予算は再計算されないことを検証します。
+        """
+        deadline = Deadline(1.0, {"role_analysis": 0.5, "prompt_generation": 0.3, "validation": 0.2})
+        self.assertAlmostEqual(deadline.stage_timeout("role_analysis"), 0.5, delta=0.02)
+        time.sleep(0.1)
+        self.assertAlmostEqual(deadline.stage_timeout("prompt_generation"), 0.9 * 0.3 / 0.5, delta=0.02)
+        self.assertAlmostEqual(deadline.stage_timeout("prompt_generation"), 0.54, delta=0.02)
+
+class TestHedger(unittest.TestCase):
+    """Hedgerのテストケース集"""
+
+    def test_hedging_cuts_tail_latency(self):
+        """
+        裾のレイテンシ短縮のテスト
+
+        同じ分布に対して、ヘッジありの場合は最も遅い2%の呼び出しの平均が短くなり、
+        ヘッジの比率が上限を超えないことを検証します。
+        """
+        baseline = Hedger(ModelRouter(), max_hedge_rate=0.0)
+        unhedged = run_calls(baseline, FakeChatModel(latency=heavy_tailed_latency(base=0.005, cap=0.5, seed=11)), 200)
+
+        hedger = Hedger(ModelRouter(), max_hedge_rate=0.1)
+        hedged = run_calls(hedger, FakeChatModel(latency=heavy_tailed_latency(base=0.005, cap=0.5, seed=11)), 200)
+
+        report = hedger.report()
+        self.assertGreater(report["hedged"], 0)
+        self.assertLessEqual(report["hedge_rate"], 0.1)
+        self.assertGreater(report["hedge_wins"], 0)
+        self.assertLess(tail_mean(hedged), tail_mean(unhedged))
+
+    def test_hedge_delay_is_per_stage(self):
+        """
+        ステージ別の待ち時間のテスト
+
+        同じモデルでもステージごとのp95がヘッジの待ち時間になることを検証します。
+        """
+        hedger = Hedger(ModelRouter(), max_hedge_rate=0.1)
+        for _ in range(10):
+            hedger.call("claude-3-haiku-20240307", lambda: time.sleep(0.001), stage="role_analysis")
+            hedger.call("claude-3-haiku-20240307", lambda: time.sleep(0.05), stage="validation")
+
+        self.assertLess(hedger.hedge_delay("claude-3-haiku-20240307", "role_analysis"), 0.02)
+        self.assertGreaterEqual(hedger.hedge_delay("claude-3-haiku-20240307", "validation"), 0.05)
+        self.assertGreaterEqual(hedger.router.stats("claude-3-haiku-20240307")["count"], 20)
+
+    def test_timeout_raises(self):
+        """
+        期限切れのテスト
+
+        応答が期限を過ぎた場合、応答を待たずにStageTimeoutErrorになることを検証します。
+        """
+        hedger = Hedger(ModelRouter(), max_hedge_rate=0.0)
+        model = FakeChatModel(latency=0.5)
+        started = time.perf_counter()
+        with self.assertRaises(StageTimeoutError):
+            hedger.call(model.model_name, lambda: model.invoke("テスト"), timeout=0.1)
+        self.assertLess(time.perf_counter() - started, 0.4)
+        self.assertEqual(hedger.report()["timeouts"], 1)
+
+class TestDeadlineChain(unittest.TestCase):
+    """期限付きのgenerate_promptのテストケース集"""
+
+    def test_stage_over_budget_raises(self):
+        """
+        ステージ予算超過のテスト
+
+        役割分析ステージが予算を超えた時点で、全体の期限を待たずに失敗することを検証します。
+        """
+        model = FakeChatModel(latency=0.5)
+        builder = PromptChainBuilder(model_factory=lambda model_name, config: model)
+        started = time.perf_counter()
+        with self.assertRaises(StageTimeoutError):
+            builder.generate_prompt("コードレビューを支援するエージェント", deadline=0.3)
+        self.assertLess(time.perf_counter() - started, 0.3)
+
+    def test_abandoned_call_is_cut_by_request_timeout(self):
+        """
+        見捨てた呼び出しの打ち切りのテスト
+
+        ステージの残り予算がリクエストのタイムアウトとしてモデルに渡され、期限切れで
+        見捨てた呼び出しが応答を待たずに失敗として記録されることを検証します。
+        """
+        model = FakeChatModel(latency=0.5)
+        builder = PromptChainBuilder(model_factory=lambda model_name, config: model)
+        started = time.perf_counter()
+        with self.assertRaises(StageTimeoutError):
+            builder.generate_prompt("コードレビューを支援するエージェント", deadline=0.3)
+        time.sleep(0.1)
+
+        self.assertLess(time.perf_counter() - started, 0.4)
+        stats = builder.router.stats(builder.stage_configs["role_analysis"].model)
+        self.assertEqual(stats["count"], 1)
+        self.assertEqual(stats["error_rate"], 1.0)
+        self.assertEqual(builder.router.stats(builder.stage_configs["role_analysis"].fallback_model)["count"], 0)
+
+    def test_stream_stall_before_first_chunk(self):
+        """
+        ストリーミングの期限のテスト
+
+        最初のチャンクが届くまでに長く停滞するモデルでも、期限で打ち切られることを検証します。
+        """
+        model = FakeChatModel(latency=3.0, ttft_ratio=0.9)
+        builder = PromptChainBuilder(model_factory=lambda model_name, config: model)
+        started = time.perf_counter()
+        with self.assertRaises(StageTimeoutError):
+            builder.generate_prompt("コードレビューを支援するエージェント", stream=True, deadline=0.3)
+        self.assertLess(time.perf_counter() - started, 0.3)
+
+    def test_result_within_deadline(self):
+        """
+        期限内の実行のテスト
+
+        期限内に終わる場合は期限なしと同じ結果が得られることを検証します。
+        """
+        model = FakeChatModel(latency=0.01)
+        builder = PromptChainBuilder(model_factory=lambda model_name, config: model)
+        result = builder.generate_prompt("コードレビューを支援するエージェント", deadline=5.0)
+
+        self.assertIsInstance(result["agent_config"], AgentConfig)
+        self.assertEqual(result, builder.generate_prompt("コードレビューを支援するエージェント"))
+        self.assertEqual(builder.hedger.report()["calls"], 6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+"""
+生成履歴ストアのテストスイート
+
+このモジュールは、HistoryStoreの以下の動作をテストします：
+1. 保存した結果の取得（AgentConfigの復元）
+2. 日本語の入力・役割名・ツール・制約条件の全文検索
+3. 3文字未満の検索語による部分一致検索
+4. 保存がリクエストをブロックしないこと
+5. 所有者ごとの履歴の分離
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from history_store import HistoryStore, owner_for
+from prompt_chain import AgentConfig, Tool
+
+def make_result(role_name, tool_name, constraint):
+    return {
+        "agent_config": AgentConfig(
+            role_name=role_name,
+            responsibilities=["支援"],
+            principles=["品質重視"],
+            tools=[Tool(name=tool_name, description=f"{tool_name}の説明", parameters=[], usage_format=f"<{tool_name}/>")],
+            constraints=[constraint]
+        ),
+        "agent_prompt": f"# {role_name}",
+        "validation_result": "問題ありません"
+    }
+
+class TestHistoryStore(unittest.TestCase):
+    """HistoryStoreのテストケース集"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = HistoryStore(os.path.join(self.temp_dir, "history.db"), flush_interval=0.05)
+        self.store.save("コードレビューを支援するエージェント", make_result("レビュー支援エージェント", "code_reviewer", "セキュリティ重視"))
+        self.store.save("タスク管理と進捗報告", make_result("タスク管理エージェント", "task_manager", "高パフォーマンス"))
+        self.assertTrue(self.store.flush(timeout=5))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_get_restores_result(self):
+        """
+        取得のテスト
+
+        保存した結果がAgentConfigを含む同じ形式で取得できることを検証します。
+        """
+        entry = self.store.search("code_reviewer")[0]
+        result = self.store.get(entry["id"])
+
+        self.assertIsInstance(result["agent_config"], AgentConfig)
+        self.assertEqual(result["agent_config"].tools[0].name, "code_reviewer")
+        self.assertEqual(result["agent_prompt"], "# レビュー支援エージェント")
+        self.assertIsNone(self.store.get(9999))
+
+    def test_full_text_search(self):
+        """
+        全文検索のテスト
+
+        入力テキスト・役割名・ツール・制約条件のいずれからも検索できることを検証します。
+        """
+        self.assertEqual([e["role_name"] for e in self.store.search("コードレビュー")], ["レビュー支援エージェント"])
+        self.assertEqual([e["role_name"] for e in self.store.search("task_manager")], ["タスク管理エージェント"])
+        self.assertEqual([e["role_name"] for e in self.store.search("パフォーマンス")], ["タスク管理エージェント"])
+        self.assertEqual(len(self.store.search("エージェント")), 2)
+        self.assertEqual(self.store.search("存在しない語句"), [])
+
+    def test_short_terms(self):
+        """
+        短い検索語のテスト
+
+        3文字未満の検索語でも部分一致で検索できることを検証します。
+        """
+        self.assertEqual([e["role_name"] for e in self.store.search("進捗")], ["タスク管理エージェント"])
+        self.assertEqual(len(self.store.search("")), 2)
+
+    def test_owners_are_isolated(self):
+        """
+        所有者の分離のテスト
+
+        他の所有者の履歴は検索にも取得にも現れないことを検証します。
+        """
+        self.store.save("社内向けレビューエージェント", make_result("社内レビューエージェント", "internal_reviewer", "機密"), owner="session-a")
+        self.assertTrue(self.store.flush(timeout=5))
+
+        entries = self.store.search("レビュー", owner="session-a")
+        self.assertEqual([e["role_name"] for e in entries], ["社内レビューエージェント"])
+        self.assertEqual(self.store.get(entries[0]["id"], owner="session-a")["user_input"], "社内向けレビューエージェント")
+        self.assertIsNone(self.store.get(entries[0]["id"], owner="session-b"))
+        self.assertIsNone(self.store.get(entries[0]["id"]))
+        self.assertEqual(self.store.search("", owner="session-b"), [])
+        self.assertEqual(self.store.search("機密", owner="session-b"), [])
+        self.assertNotIn("社内レビューエージェント", [e["role_name"] for e in self.store.search("レビュー")])
+
+    def test_same_identity_sees_history_across_sessions(self):
+        """
+        識別情報による所有者のテスト
+
+        同じAPIキーから導いた所有者であれば、別のセッション（別のストアのインスタンス）でも
+        最初のセッションの履歴が見え、別のキーでは見えないことを検証します。
+        """
+        owner = owner_for("sk-ant-user-a")
+        self.assertEqual(owner, owner_for("sk-ant-user-a"))
+        self.assertNotEqual(owner, owner_for("sk-ant-user-b"))
+        self.assertNotIn("sk-ant-user-a", owner)
+
+        self.store.save("議事録を要約するエージェント", make_result("議事録要約エージェント", "summarizer", "簡潔"), owner=owner)
+        self.store.close()
+
+        self.store = HistoryStore(self.store.db_path, flush_interval=0.05)
+        entries = self.store.search("議事録", owner=owner_for("sk-ant-user-a"))
+        self.assertEqual([e["role_name"] for e in entries], ["議事録要約エージェント"])
+        self.assertEqual(self.store.get(entries[0]["id"], owner=owner_for("sk-ant-user-a"))["user_input"], "議事録を要約するエージェント")
+        self.assertEqual(self.store.search("議事録", owner=owner_for("sk-ant-user-b")), [])
+
+    def test_save_does_not_block(self):
+        """
+        非ブロッキング保存のテスト
+
+        大量の保存がキューに積まれるだけで即座に戻り、後でまとめて書き込まれることを検証します。
+        """
+        result = make_result("一括保存エージェント", "bulk_tool", "制約")
+        started = time.perf_counter()
+        for i in range(200):
+            self.store.save(f"一括保存 {i}", result)
+        self.assertLess(time.perf_counter() - started, 0.1)
+
+        self.assertTrue(self.store.flush(timeout=5))
+        self.assertEqual(len(self.store.search("一括保存", limit=500)), 200)
+
+if __name__ == '__main__':
+    unittest.main()
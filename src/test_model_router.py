@@ -0,0 +1,165 @@
+"""
+ステージ別モデル設定とルーティングのテストスイート
+
+疑似チャットモデル（FakeChatModel）にレイテンシとエラーを注入し、
+APIを呼び出さずに以下を検証します：
+1. ルーターの健全性判定
+2. ステージごとのモデル設定の反映
+3. ステージ設定の部分上書き
+4. 遅延・障害時の代替モデルへのフォールバック
+"""
+
+import unittest
+from fake_llm import FakeChatModel, FakeModelError
+from model_router import DEFAULT_STAGE_CONFIGS, ModelRouter, StageModelConfig, PROMPT_GENERATION, ROLE_ANALYSIS, VALIDATION
+from prompt_chain import PromptChainBuilder, AgentConfig
+
+class TestModelRouter(unittest.TestCase):
+    """ModelRouterのテストケース集"""
+
+    def test_unhealthy_primary_is_demoted(self):
+        """
+        遅いモデルの降格テスト
+
+        p95レイテンシがしきい値を超えた主モデルが代替モデルの後ろに回ることを検証します。
+        """
+        router = ModelRouter(latency_threshold=0.5, min_samples=3)
+        config = StageModelConfig(model="slow", fallback_model="fast")
+        self.assertEqual(router.route(config), ["slow", "fast"])
+
+        for _ in range(3):
+            router.record("slow", 1.0)
+        self.assertFalse(router.is_healthy("slow"))
+        self.assertEqual(router.route(config), ["fast", "slow"])
+
+    def test_error_rate_marks_unhealthy(self):
+        """
+        エラー率による降格テスト
+
+        エラー率がしきい値を超えたモデルが不健全と判定されることを検証します。
+        """
+        router = ModelRouter(error_rate_threshold=0.4, min_samples=4)
+        for ok in (True, False, False, True):
+            router.record("flaky", 0.1, ok=ok)
+        self.assertAlmostEqual(router.stats("flaky")["error_rate"], 0.5)
+        self.assertFalse(router.is_healthy("flaky"))
+
+class TestStageRouting(unittest.TestCase):
+    """PromptChainBuilderのステージ別ルーティングのテストケース集"""
+
+    def setUp(self):
+        self.models = {
+            "small": FakeChatModel(model_name="small"),
+            "large": FakeChatModel(model_name="large"),
+        }
+        self.requested = []
+
+        def factory(model_name, config):
+            self.requested.append((model_name, config.temperature, config.max_tokens))
+            return self.models.setdefault(model_name, FakeChatModel(model_name=model_name))
+
+        self.factory = factory
+
+    def test_stage_configs_are_applied(self):
+        """
+        ステージ設定の反映テスト
+
+        各ステージが指定したモデル・温度・最大トークン数で生成されることを検証します。
+        """
+        builder = PromptChainBuilder(
+            stage_configs={
+                ROLE_ANALYSIS: {"model": "small", "temperature": 0.2, "max_tokens": 512},
+                PROMPT_GENERATION: {"model": "large", "temperature": 0.7, "max_tokens": 4096},
+                VALIDATION: {"model": "small", "temperature": 0.0, "max_tokens": 256},
+            },
+            model_factory=self.factory
+        )
+        result = builder.generate_prompt("タスク管理エージェントが必要です")
+
+        self.assertIsInstance(result["agent_config"], AgentConfig)
+        self.assertIn(("small", 0.2, 512), self.requested)
+        self.assertIn(("large", 0.7, 4096), self.requested)
+        self.assertIn(("small", 0.0, 256), self.requested)
+        self.assertEqual(self.models["small"].call_count, 2)
+        self.assertEqual(self.models["large"].call_count, 1)
+
+    def test_stage_override_merges_defaults(self):
+        """
+        ステージ設定の部分上書きテスト
+
+        指定した項目のみが既定値を上書きし、未知のステージ名はエラーになることを検証します。
+        """
+        default = DEFAULT_STAGE_CONFIGS[ROLE_ANALYSIS]
+        builder = PromptChainBuilder(
+            stage_configs={
+                ROLE_ANALYSIS: {"model": "small"},
+                VALIDATION: StageModelConfig(model="small", fallback_model=None)
+            },
+            model_factory=self.factory
+        )
+        config = builder.stage_configs[ROLE_ANALYSIS]
+
+        self.assertEqual(config.model, "small")
+        self.assertEqual(config.fallback_model, default.fallback_model)
+        self.assertEqual(config.temperature, default.temperature)
+        self.assertEqual(config.max_tokens, default.max_tokens)
+        self.assertEqual(config.deadline_share, default.deadline_share)
+        self.assertIsNone(builder.stage_configs[VALIDATION].fallback_model)
+        self.assertEqual(builder.stage_configs[VALIDATION].max_tokens, DEFAULT_STAGE_CONFIGS[VALIDATION].max_tokens)
+        with self.assertRaises(ValueError):
+            PromptChainBuilder(stage_configs={"unknown": {"model": "small"}}, model_factory=self.factory)
+
+    def test_failing_model_falls_back(self):
+        """
+        障害時のフォールバックテスト
+
+        主モデルが失敗した場合に代替モデルの応答が使われることを検証します。
+        """
+        self.models["small"].error_rate = 1.0
+        builder = PromptChainBuilder(
+            stage_configs={ROLE_ANALYSIS: {"model": "small", "fallback_model": "large"}},
+            model_factory=self.factory
+        )
+        result = builder.create_role_analysis_chain().invoke({"user_input": "テスト"})
+
+        self.assertIsInstance(result, AgentConfig)
+        self.assertEqual(builder.router.stats("small")["error_rate"], 1.0)
+        self.assertEqual(self.models["large"].call_count, 1)
+
+    def test_slow_model_is_routed_around(self):
+        """
+        遅延時のルーティングテスト
+
+        主モデルのp95がしきい値を超えた後は代替モデルが先に呼ばれることを検証します。
+        """
+        self.models["small"].latency = 0.05
+        router = ModelRouter(latency_threshold=0.02, min_samples=2)
+        builder = PromptChainBuilder(
+            stage_configs={VALIDATION: {"model": "small", "fallback_model": "large"}},
+            router=router,
+            model_factory=self.factory
+        )
+        chain = builder.create_validation_chain()
+        for _ in range(4):
+            chain.invoke({"agent_prompt": "{{ role.name }}"})
+
+        self.assertEqual(self.models["small"].call_count, 2)
+        self.assertEqual(self.models["large"].call_count, 2)
+
+    def test_all_models_failing_raises(self):
+        """
+        全モデル障害時のテスト
+
+        すべての候補が失敗した場合に例外が送出されることを検証します。
+        """
+        for model in self.models.values():
+            model.error_rate = 1.0
+        builder = PromptChainBuilder(
+            stage_configs={VALIDATION: {"model": "small", "fallback_model": "large"}},
+            model_factory=self.factory
+        )
+        with self.assertRaises(FakeModelError):
+            builder.create_validation_chain().invoke({"agent_prompt": "テスト"})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+オンデマンドプロファイリングのテストスイート
+
+このモジュールは、profile_sectionの以下の動作をテストします：
+1. 計測結果のファイル出力
+2. 並行するセクションが失敗せず、計測が1つに限られること
+3. ワーカースレッドのスタック採取
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from profiling import ProfileSettings, profile_section
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+class TestProfileSection(unittest.TestCase):
+    """profile_sectionのテストケース集"""
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.settings = ProfileSettings(output_dir=self.output_dir, interval=0.001)
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_writes_profile(self):
+        """
+        出力のテスト
+
+        cProfileの統計と折り畳みスタックが出力されることを検証します。
+        """
+        with profile_section("unit", enabled=True, settings=self.settings) as base:
+            busy(0.05)
+
+        self.assertIsNotNone(base)
+        self.assertTrue(os.path.exists(f"{base}.prof"))
+        self.assertIn("busy", open(f"{base}.collapsed", encoding="utf-8").read())
+
+    def test_concurrent_sections_do_not_fail(self):
+        """
+        並行計測のテスト
+
+        別スレッドで計測中に開始されたセクションはプロファイルされずに実行されることを検証します。
+        """
+        started = threading.Event()
+        release = threading.Event()
+
+        def first():
+            with profile_section("first", enabled=True, settings=self.settings) as base:
+                started.set()
+                release.wait(5)
+            return base
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(first)
+            started.wait(5)
+            with profile_section("second", enabled=True, settings=self.settings) as base:
+                busy(0.01)
+            release.set()
+            self.assertIsNotNone(future.result())
+        self.assertIsNone(base)
+
+        with profile_section("third", enabled=True, settings=self.settings) as base:
+            pass
+        self.assertIsNotNone(base)
+
+    def test_worker_threads_are_sampled(self):
+        """
+        ワーカースレッド採取のテスト
+
+        ステージ実行用のワーカーで実行中の処理がスレッド名付きで採取されることを検証します。
+        """
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="hayashi-stage") as executor:
+            with profile_section("workers", enabled=True, settings=self.settings) as base:
+                executor.submit(busy, 0.1).result()
+
+        collapsed = open(f"{base}.collapsed", encoding="utf-8").read()
+        self.assertRegex(collapsed, r"(?m)^hayashi-stage_0;.*test_profiling\.py:busy")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,13 +8,24 @@ Hayashi Agent Prompt Generatorのテストスイート
 4. 完全な生成パイプライン
 
 各テストケースは、特定の機能を検証し、期待される出力と実際の出力を比較します。
+
+LLM呼び出しはカセット（src/cassettes/）から再生されるため、ネットワークなしで実行できます。
+環境変数 HAYASHI_CASSETTE_MODE で動作を切り替えます：
+    - replay（既定）: 記録済みの応答を再生（カセットがない場合はスキップ。環境変数 CI が設定されている場合は失敗）
+    - record: APIを呼び出してカセットを記録し直す（ANTHROPIC_API_KEYが必要）
+    - auto: 記録済みなら再生し、未記録の呼び出しのみ記録する
+    - live: カセットを使わずAPIを直接呼び出す
+HAYASHI_CASSETTE_LATENCY に "recorded" または秒数を指定すると、再生時に遅延を再現します。
 """
 
 import unittest
 from prompt_chain import PromptChainBuilder, Tool, AgentConfig
+from cassette import cassette_model_factory
 import os
 from dotenv import load_dotenv
 
+CASSETTE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cassettes")
+
 class TestPromptChainBuilder(unittest.TestCase):
     """
     PromptChainBuilderのテストケース集
@@ -31,10 +42,31 @@ class TestPromptChainBuilder(unittest.TestCase):
         """
         テストクラスの初期化
 
-        環境変数を読み込み、ビルダーインスタンスを作成します。
+        環境変数を読み込み、カセットモードに応じたビルダーインスタンスを作成します。
         """
         load_dotenv()
-        cls.builder = PromptChainBuilder()
+        mode = os.getenv("HAYASHI_CASSETTE_MODE", "replay")
+        if mode == "live":
+            cls.builder = PromptChainBuilder()
+            return
+        if mode == "replay" and not (
+            os.path.isdir(CASSETTE_DIR) and any(name.endswith(".json") for name in os.listdir(CASSETTE_DIR))
+        ):
+            message = "カセットが未記録です（HAYASHI_CASSETTE_MODE=record で記録してください）"
+            if os.getenv("CI"):
+                raise RuntimeError(message)
+            raise unittest.SkipTest(message)
+        latency = os.getenv("HAYASHI_CASSETTE_LATENCY")
+        if latency and latency != "recorded":
+            latency = float(latency)
+        cls.builder = PromptChainBuilder(
+            model_factory=cassette_model_factory(
+                CASSETTE_DIR,
+                mode=mode,
+                base_factory=PromptChainBuilder._create_anthropic_model,
+                latency=latency
+            )
+        )
 
     def test_role_analysis_chain(self):
         """
@@ -0,0 +1,102 @@
+"""
+ストリーミング部分JSONパーサーのテストスイート
+
+このモジュールは、以下をテストします：
+1. チャンク単位で受信したJSONのフィールドごとの検証
+2. 先行レンダリング結果と str(AgentConfig) の一致
+3. 不正なフィールドの早期検出
+4. 役割分析のストリーミングによる後続ステージの早期開始
+"""
+
+import json
+import time
+import unittest
+from pydantic import ValidationError
+from fake_llm import FakeChatModel, SAMPLE_AGENT_CONFIG, default_responder
+from prompt_chain import PromptChainBuilder, AgentConfig
+from stream_parser import StreamingModelParser
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+class TestStreamingModelParser(unittest.TestCase):
+    """StreamingModelParserのテストケース集"""
+
+    def test_fields_arrive_in_order(self):
+        """
+        逐次解析のテスト
+
+        前置きと後続の説明文を含む応答から、フィールドが到着順に検証され、
+        オブジェクトが閉じた時点で完成したAgentConfigが得られることを検証します。
+        """
+        payload = json.dumps(SAMPLE_AGENT_CONFIG, ensure_ascii=False)
+        text = f"```json\n{payload}\n```\n以上が設定です。"
+        seen = []
+        parser = StreamingModelParser(AgentConfig, on_field=lambda name, value: seen.append(name))
+        for chunk in chunked(text, 7):
+            parser.feed(chunk)
+
+        self.assertTrue(parser.done)
+        self.assertEqual(seen, list(SAMPLE_AGENT_CONFIG))
+        self.assertEqual(parser.result, AgentConfig(**SAMPLE_AGENT_CONFIG))
+        self.assertEqual(parser.rendered_config(), str(parser.result))
+        self.assertIn("以上が設定です。", parser.trailing)
+
+    def test_strings_with_delimiters(self):
+        """
+        区切り文字を含む文字列のテスト
+
+        文字列内の括弧・カンマ・エスケープされた引用符で誤判定しないことを検証します。
+        """
+        config = dict(SAMPLE_AGENT_CONFIG, role_name='役割 {"a", [b]} \\" ,}')
+        parser = StreamingModelParser(AgentConfig)
+        for chunk in chunked(json.dumps(config, ensure_ascii=False), 3):
+            parser.feed(chunk)
+
+        self.assertEqual(parser.result.role_name, config["role_name"])
+
+    def test_invalid_field_fails_early(self):
+        """
+        早期検出のテスト
+
+        型が不正なフィールドはオブジェクトが閉じる前に検出されることを検証します。
+        """
+        parser = StreamingModelParser(AgentConfig)
+        parser.feed('{"role_name": "テスト", ')
+        with self.assertRaises(ValidationError):
+            parser.feed('"responsibilities": "リストではない", ')
+        self.assertFalse(parser.done)
+
+class TestStreamingChain(unittest.TestCase):
+    """役割分析のストリーミング実行のテストケース集"""
+
+    def test_downstream_starts_before_trailing_text(self):
+        """
+        早期開始のテスト
+
+        役割分析の後に長い説明文が続く場合でも、結果は通常実行と一致し、
+        説明文を受信せずにストリームを閉じることで全体の時間が短くなることを検証します。
+        """
+        def responder(prompt):
+            text = default_responder(prompt)
+            if text.startswith("{"):
+                text = f"```json\n{text}\n```\n\n補足説明: " + "この設定は要件に基づいています。" * 20
+            return text
+
+        model = FakeChatModel(responder=responder, latency=0.4, chunk_size=16)
+        builder = PromptChainBuilder(model_factory=lambda model_name, config: model)
+
+        streamed = builder.generate_prompt("コードレビューを支援するエージェント", stream=True)
+        started = time.perf_counter()
+        regular = builder.generate_prompt("コードレビューを支援するエージェント")
+        regular_total = time.perf_counter() - started
+
+        self.assertEqual(streamed["agent_config"], regular["agent_config"])
+        self.assertEqual(streamed["agent_prompt"], regular["agent_prompt"])
+        timings = streamed["timings"]
+        self.assertTrue(timings["role_analysis_closed_early"])
+        self.assertLess(timings["role_analysis_parsed"], 0.4)
+        self.assertLess(timings["total"], regular_total - 0.05)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+"""
+生成テンプレートレンダラーのテストスイート
+
+このモジュールは、GeneratedTemplateRendererの以下の動作をテストします：
+1. コードフェンス付きの生成テンプレートとマクロのインポートの解決
+2. コンパイル済みテンプレートのキャッシュと上限による追い出し
+3. 複数コンテキストの一括レンダリング
+4. 信頼できないテンプレートコードのサンドボックス化
+5. 出力サイズ・演算の規模・レンダリング時間の制限
+"""
+
+import os
+import time
+import unittest
+from jinja2.sandbox import SecurityError
+from template_renderer import GeneratedTemplateRenderer, RenderLimitError, context_from_config, extract_template
+
+TEMPLATES_PATH = os.path.join(os.path.dirname(__file__), "..", "templates")
+
+GENERATED_PROMPT = """```jinja2
+{% import 'macros/formatting.j2' as fmt %}
+{{ fmt.section('基本原則') }}
+# {{ role.name }} v{{ version }}
+{% for principle in role.principles %}
+- {{ principle }}
+{% endfor %}
+{% for tool in tools %}
+### {{ tool.name }}
+{% endfor %}
+```"""
+
+CONFIG = {
+    "role_name": "開発支援エージェント",
+    "responsibilities": ["タスク管理"],
+    "principles": ["効率性重視", "品質重視"],
+    "tools": [{"name": "task_manager", "description": "タスク管理ツール"}],
+    "constraints": []
+}
+
+class TestGeneratedTemplateRenderer(unittest.TestCase):
+    """GeneratedTemplateRendererのテストケース集"""
+
+    def setUp(self):
+        self.renderer = GeneratedTemplateRenderer(TEMPLATES_PATH, cache_size=2)
+
+    def test_render_generated_template(self):
+        """
+        レンダリングのテスト
+
+        コードフェンスを取り除き、マクロをインポートしてAgentConfigの値が展開されることを検証します。
+        フェンスの前後に説明文や他の言語のコードブロックがある場合も、テンプレートのブロックだけが
+        使われることを検証します。
+        """
+        rendered = self.renderer.render(GENERATED_PROMPT, context_from_config(CONFIG))
+
+        self.assertNotIn("```", rendered)
+        self.assertIn("## 基本原則", rendered)
+        self.assertIn("# 開発支援エージェント v1.0.0", rendered)
+        self.assertIn("- 品質重視", rendered)
+        self.assertIn("### task_manager", rendered)
+
+        with_preamble = f"以下がテンプレートです。\n```yaml\nrole: dev\n```\n{GENERATED_PROMPT}\n\n変数は role と tools です。"
+        self.assertEqual(extract_template(with_preamble), extract_template(GENERATED_PROMPT))
+        self.assertEqual(self.renderer.render(with_preamble, context_from_config(CONFIG)), rendered)
+        self.assertEqual(extract_template("説明\n```\n{{ a }}\n```\n補足"), "{{ a }}")
+        self.assertEqual(extract_template("  {{ a }}\n"), "{{ a }}")
+
+    def test_repeated_renders_hit_cache(self):
+        """
+        キャッシュのテスト
+
+        同じソースの2回目以降はコンパイルされず、上限を超えると古いものから追い出されることを検証します。
+        """
+        context = context_from_config(CONFIG)
+        first = self.renderer.compile(GENERATED_PROMPT)
+        self.renderer.render(GENERATED_PROMPT, context)
+        self.renderer.render(extract_template(GENERATED_PROMPT), context)
+        self.assertIs(self.renderer.compile(GENERATED_PROMPT), first)
+        self.assertEqual(self.renderer.cache_info()["misses"], 1)
+        self.assertEqual(self.renderer.cache_info()["hits"], 3)
+
+        self.renderer.compile("{{ a }}")
+        self.renderer.compile("{{ b }}")
+        self.assertEqual(self.renderer.cache_info()["size"], 2)
+        self.assertIsNot(self.renderer.compile(GENERATED_PROMPT), first)
+
+    def test_render_many(self):
+        """
+        一括レンダリングのテスト
+
+        コンテキストごとの結果が順番どおりに返され、コンパイルは1回だけであることを検証します。
+        """
+        contexts = [
+            context_from_config(dict(CONFIG, role_name=f"エージェント{i}"), version=f"1.{i}")
+            for i in range(50)
+        ]
+        results = self.renderer.render_many(GENERATED_PROMPT, contexts)
+
+        self.assertEqual(len(results), 50)
+        self.assertIn("# エージェント7 v1.7", results[7])
+        self.assertEqual(self.renderer.cache_info()["misses"], 1)
+
+    def test_unsafe_template_is_rejected(self):
+        """
+        サンドボックスのテスト
+
+        内部属性は未定義として扱われ、それを経由した呼び出しがSecurityErrorになることを検証します。
+        """
+        with self.assertRaises(SecurityError):
+            self.renderer.render("{{ ''.__class__.__mro__[1].__subclasses__() }}", {})
+        rendered = self.renderer.render("[{{ role.name.__class__ }}]", context_from_config(CONFIG))
+        self.assertEqual(rendered, "[]")
+
+    def test_large_values_are_rejected(self):
+        """
+        演算の規模の制限のテスト
+
+        巨大な文字列・リストの繰り返し、べき乗、書式の幅、namespace を使った連結の倍増などが
+        評価前にRenderLimitErrorになることを検証します。
+        """
+        templates = [
+            "{{ 'a' * 300000000 }}",
+            "{{ 300000000 * 'a' }}",
+            "{{ ['abc'] * 1000000 }}",
+            "{% set s = 'a' * 1000 %}{{ [s] * 10000 }}",
+            "{{ 10 ** 100000000 }}",
+            "{{ '%300000000s' % 'a' }}",
+            "{{ '{:>300000000}'.format('a') }}",
+            "{{ 'a' | center(300000000) }}",
+            "{{ '%300000000s' | format('a') }}",
+            "{{ 'a'.ljust(300000000) }}",
+            "{% set ns = namespace(s='a') %}{% for i in range(26) %}{% set ns.s = ns.s ~ ns.s %}{% endfor %}",
+            "{% set ns = namespace(s='a') %}{% for i in range(26) %}{% set ns.s = ns.s + ns.s %}{% endfor %}",
+            "{% set ns = namespace(s='a') %}{% for i in range(26) %}{% set ns.s = [ns.s, ns.s]|join %}{% endfor %}",
+            "{% set ns = namespace(s='a') %}{% for i in range(26) %}{% set ns.s = '{}{}'.format(ns.s, ns.s) %}{% endfor %}",
+            "{% set ns = namespace(n=3) %}{% for i in range(40) %}{% set ns.n = ns.n * ns.n %}{% endfor %}",
+            "{{ ('a' * 1001) | replace('a', 'a' * 1000) }}",
+            "{{ ('x' * 1000).join(['a' * 1000] * 1000) }}",
+        ]
+        for template in templates:
+            started = time.perf_counter()
+            with self.assertRaises(RenderLimitError, msg=template):
+                self.renderer.render(template, {})
+            self.assertLess(time.perf_counter() - started, 0.5, template)
+        self.assertEqual(self.renderer.render("{{ '-' * 20 }}{{ 2 ** 10 }}", {}), "-" * 20 + "1024")
+        self.assertEqual(self.renderer.render("{% set ns = namespace(s='a') %}{% set ns.s = ns.s ~ 'b' + 'c' %}{{ ns.s }}", {}), "abc")
+
+    def test_output_size_is_limited(self):
+        """
+        出力サイズの制限のテスト
+
+        個々の値は小さくても、出力の合計が上限を超えた時点でRenderLimitErrorになることを検証します。
+        """
+        renderer = GeneratedTemplateRenderer(TEMPLATES_PATH, max_output_size=10000)
+        with self.assertRaises(RenderLimitError):
+            renderer.render("{% for i in range(100000) %}{{ 'x' * 100 }}{% endfor %}", {})
+        self.assertEqual(len(renderer.render("{% for i in range(50) %}{{ 'x' * 100 }}{% endfor %}", {})), 5000)
+
+    def test_render_timeout(self):
+        """
+        レンダリング時間の制限のテスト
+
+        入れ子のループが終わらないテンプレートがタイムアウトで打ち切られることを検証します。
+        """
+        renderer = GeneratedTemplateRenderer(TEMPLATES_PATH, render_timeout=0.2)
+        started = time.perf_counter()
+        with self.assertRaises(RenderLimitError):
+            renderer.render("{% for i in range(100000) %}{% for j in range(100000) %}{% endfor %}{% endfor %}", {})
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertIn("# 開発支援エージェント", renderer.render(GENERATED_PROMPT, context_from_config(CONFIG)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+"""
+ツール選択インデックスのテストスイート
+
+このモジュールは、ToolIndexの以下の動作をテストします：
+1. 日本語を含むテキストのトークナイズ
+2. BM25による関連ツールの検索
+3. 固定ツールと上位k件の選択
+4. 長いクエリでの順位が全語を使った厳密なBM25と一致すること
+5. 大規模カタログでの検索時間
+"""
+
+from collections import Counter
+import math
+import os
+import random
+import time
+import unittest
+from unittest import mock
+import yaml
+import tool_index
+from tool_index import ToolIndex, tokenize, tool_text
+
+TOOLS_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "config", "tools_config.yaml")
+
+def synthetic_catalog(size, words_per_tool, seed=0):
+    rng = random.Random(seed)
+    kanji = [chr(code) for code in range(0x4e00, 0x4e00 + 2000)]
+    words = ["".join(rng.choice(kanji) for _ in range(2)) for _ in range(3000)]
+    catalog = [
+        {
+            "name": f"tool_{i}",
+            "description": "の".join(rng.choice(words) for _ in range(words_per_tool)) + "を行います",
+            "parameters": [{"name": "target", "description": rng.choice(words) + "の指定"}]
+        }
+        for i in range(size)
+    ]
+    return catalog, rng
+
+def sample_query(catalog, rng, word_count):
+    """カタログの1件の説明文から語を抜き出したクエリと、その元のツール番号を返す"""
+    position = rng.randrange(len(catalog))
+    words = catalog[position]["description"][:-len("を行います")].split("の")
+    return "の".join(rng.sample(words, min(word_count, len(words)))), position
+
+def exact_bm25(index, query):
+    """索引を使わずに全ツールの全語でBM25スコアを計算する"""
+    documents = []
+    for tool in index.tools:
+        name, text = tool_text(tool)
+        doc = Counter(tokenize(text))
+        for token in tokenize(name):
+            doc[token] += index.name_weight
+        documents.append(doc)
+    average = sum(sum(doc.values()) for doc in documents) / len(documents)
+    scores = [0.0] * len(documents)
+    for term in set(tokenize(query)):
+        df = sum(1 for doc in documents if term in doc)
+        if not df:
+            continue
+        idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+        for position, doc in enumerate(documents):
+            tf = doc.get(term, 0)
+            if tf:
+                norm = index.k1 * (1 - index.b + index.b * sum(doc.values()) / average)
+                scores[position] += idf * tf * (index.k1 + 1) / (tf + norm)
+    return scores
+
+class TestToolIndex(unittest.TestCase):
+    """ToolIndexのテストケース集"""
+
+    @classmethod
+    def setUpClass(cls):
+        with open(TOOLS_CONFIG_PATH, 'r', encoding='utf-8') as f:
+            cls.tools = yaml.safe_load(f)['tools']
+        cls.index = ToolIndex(cls.tools)
+
+    def test_tokenize(self):
+        """
+        トークナイズのテスト
+
+        英数字が単語単位、日本語が文字バイグラムに分割されることを検証します。
+        """
+        self.assertEqual(tokenize("Task_Manager"), ["task", "manager"])
+        self.assertEqual(tokenize("タスク管理"), ["タス", "スク", "ク管", "管理"])
+        self.assertEqual(tokenize("ＡＰＩ"), ["api"])
+
+    def test_search_ranks_relevant_tool_first(self):
+        """
+        関連度検索のテスト
+
+        入力に最も関連するツールが先頭に来ることを検証します。
+        """
+        cases = {
+            "コードレビューをお願いしたい": "code_reviewer",
+            "セキュリティの脆弱性を検出": "security_validator",
+            "APIドキュメントを書きたい": "doc_generator",
+        }
+        for query, expected in cases.items():
+            hits = self.index.search(query, top_k=3)
+            self.assertEqual(hits[0][0]["name"], expected, query)
+
+    def test_select_includes_pinned(self):
+        """
+        ツール選択のテスト
+
+        固定ツールが先頭に含まれ、関連ツールがtop_k件まで続くことを検証します。
+        """
+        selected = self.index.select("セキュリティ", top_k=1, pinned=["task_manager"])
+        self.assertEqual([tool["name"] for tool in selected], ["task_manager", "security_validator"])
+        self.assertEqual(len(self.index.select("", top_k=1)), len(self.tools))
+
+    def test_long_query_matches_exact_bm25(self):
+        """
+        順位の品質テスト
+
+        30語のクエリで、上位10件のスコアが全語を使った厳密なBM25と一致することを、
+        numpyによる集計と純Pythonによる集計の両方で検証します。
+        """
+        catalog, rng = synthetic_catalog(500, 30, seed=1)
+        queries = [sample_query(catalog, rng, 30)[0] for _ in range(20)]
+        indexes = {"numpy": ToolIndex(catalog, max_df_ratio=1.0, cache_size=0)}
+        with mock.patch.object(tool_index, "np", None):
+            indexes["python"] = ToolIndex(catalog, max_df_ratio=1.0, cache_size=0)
+        for query in queries:
+            expected = sorted(exact_bm25(indexes["python"], query), reverse=True)[:10]
+            for name, index in indexes.items():
+                scores = [score for _, score in index.search(query, top_k=10)]
+                self.assertEqual(len(scores), 10, name)
+                for actual, exact in zip(scores, expected):
+                    self.assertAlmostEqual(actual, exact, places=9, msg=name)
+
+    def test_long_query_finds_source_tool(self):
+        """
+        長いクエリの再現率テスト
+
+        既定の設定（高頻度語の除外あり）で、説明文から抜き出した30語のクエリの元のツールが
+        上位10件に含まれることを検証します。
+        """
+        catalog, rng = synthetic_catalog(2000, 30, seed=2)
+        index = ToolIndex(catalog, cache_size=0)
+        for _ in range(50):
+            query, position = sample_query(catalog, rng, 30)
+            names = [tool["name"] for tool, _ in index.search(query, top_k=10)]
+            self.assertIn(catalog[position]["name"], names, query)
+
+    def test_large_catalog_query_latency(self):
+        """
+        大規模カタログの検索時間テスト
+
+        10,000件のカタログで30語のクエリの検索時間の中央値が50ミリ秒未満であることを検証します。
+        手元の計測では1ミリ秒未満ですが、CIの負荷による揺れを考慮して上限に余裕を持たせています。
+        """
+        catalog, rng = synthetic_catalog(10000, 30)
+        index = ToolIndex(catalog, cache_size=0)
+        queries = [sample_query(catalog, rng, 30)[0] for _ in range(100)]
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query, top_k=10)
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        self.assertLess(latencies[len(latencies) // 2], 0.05)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,287 @@
+"""
+関連度順のツール選択
+
+このモジュールは、大規模なツールカタログから入力に関連するツールだけを選び出すための
+インメモリ転置インデックス（BM25）を提供します。インデックスは読み込み時に一度だけ構築し、
+リクエストごとに上位k件と固定（pinned）ツールのみをプロンプトへ描画します。
+
+検索はクエリの全語を使った厳密なBM25です。numpyがある環境（langchainの依存として
+通常は導入済み）ではポスティングを連続した配列に格納し、bincountで一括集計します。
+numpyがない場合は純PythonのMaxScore方式で集計します（結果は同じです）。
+
+トークナイズ:
+    - NFKC正規化と小文字化を行います
+    - 英数字は単語単位（snake_caseは "_" で分割）で扱います
+    - 日本語（ひらがな・カタカナ・漢字）は形態素解析を使わず文字バイグラムで扱います
+
+使用例:
+    >>> from tool_index import ToolIndex
+    >>> index = ToolIndex(tools)
+    >>> index.select("タスクの進捗を管理したい", top_k=5, pinned=["read_file"])
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import heapq
+import math
+import re
+import threading
+import unicodedata
+
+try:
+    import numpy as np
+except ImportError:  # numpyがない環境では純Pythonの集計にフォールバックする
+    np = None
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+|[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+")
+_ASCII_PATTERN = re.compile(r"[a-z0-9]")
+
+def tokenize(text: str) -> List[str]:
+    """
+    テキストをインデックス用のトークン列に分割
+
+    Args:
+        text (str): 対象テキスト
+
+    Returns:
+        List[str]: トークンのリスト（英数字は単語、日本語は文字バイグラム）
+    """
+    tokens: List[str] = []
+    for run in _WORD_PATTERN.findall(unicodedata.normalize("NFKC", text).lower()):
+        if _ASCII_PATTERN.match(run) or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def _field(tool: Any, key: str, default: Any = None) -> Any:
+    """辞書・Pydanticモデルのどちらからでもフィールドを取得"""
+    if isinstance(tool, dict):
+        return tool.get(key, default)
+    return getattr(tool, key, default)
+
+def tool_text(tool: Any) -> Tuple[str, str]:
+    """
+    ツール定義から検索対象のテキストを抽出
+
+    Args:
+        tool: ツール定義（dict または Tool）
+
+    Returns:
+        Tuple[str, str]: (ツール名, 説明とパラメータ説明を連結したテキスト)
+    """
+    parts = [str(_field(tool, "description", "") or "")]
+    for param in _field(tool, "parameters", None) or []:
+        if isinstance(param, dict):
+            parts.extend(str(value) for value in param.values())
+        else:
+            parts.append(str(param))
+    parts.extend(str(param) for param in _field(tool, "required_params", None) or [])
+    return str(_field(tool, "name", "")), " ".join(parts)
+
+class ToolIndex:
+    """
+    ツールカタログに対するBM25転置インデックス
+
+    各ポスティングには ツール番号→BM25重み を事前計算して保持するため、
+    検索時は該当ポスティングの重みを加算するだけで済みます。文書頻度が
+    max_df_ratio を超える語（「ます」「を行」などほぼ全件に現れる語）は
+    順位への寄与が小さいため索引から除外します。
+
+    クエリの語やポスティングの切り詰めは行いません。ユーザー入力全体（100語以上）を
+    クエリにしても、すべての語がスコアに反映されます。
+
+    Attributes:
+        tools (List[Any]): カタログ順のツール定義
+        k1 (float): BM25の語頻度飽和パラメータ
+        b (float): BM25の文書長正規化パラメータ
+        name_weight (int): ツール名のトークンに与える重み（出現回数の倍率）
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[Any],
+        k1: float = 1.2,
+        b: float = 0.75,
+        name_weight: int = 2,
+        max_df_ratio: float = 0.5,
+        cache_size: int = 256
+    ):
+        self.tools = list(tools)
+        self.k1 = k1
+        self.b = b
+        self.name_weight = name_weight
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._max_weights: Dict[str, float] = {}
+        # numpy使用時のポスティング: 語 → (開始, 終了) と、全語分を連結したツール番号・重みの配列
+        self._spans: Dict[str, Tuple[int, int]] = {}
+        self._positions = None
+        self._weights = None
+        self._cache: "OrderedDict[Tuple[Tuple[str, ...], int], List[Tuple[int, float]]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self._build(max_df_ratio)
+
+    def _build(self, max_df_ratio: float):
+        """転置インデックスを構築"""
+        term_freqs: List[Dict[str, int]] = []
+        lengths: List[int] = []
+        for tool in self.tools:
+            name, text = tool_text(tool)
+            freqs: Dict[str, int] = {}
+            for token in tokenize(name):
+                freqs[token] = freqs.get(token, 0) + self.name_weight
+            for token in tokenize(text):
+                freqs[token] = freqs.get(token, 0) + 1
+            term_freqs.append(freqs)
+            lengths.append(sum(freqs.values()))
+
+        count = len(self.tools)
+        avg_length = (sum(lengths) / count) if count else 0.0
+        doc_freqs: Dict[str, int] = {}
+        for freqs in term_freqs:
+            for token in freqs:
+                doc_freqs[token] = doc_freqs.get(token, 0) + 1
+
+        max_df = max(1, int(count * max_df_ratio)) if count > 1 else count
+        postings: Dict[str, Dict[int, float]] = {}
+        for position, freqs in enumerate(term_freqs):
+            norm = self.k1 * (1 - self.b + self.b * lengths[position] / avg_length) if avg_length else self.k1
+            for token, tf in freqs.items():
+                df = doc_freqs[token]
+                if df > max_df:
+                    continue
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                postings.setdefault(token, {})[position] = idf * tf * (self.k1 + 1) / (tf + norm)
+        if np is None:
+            self._postings = postings
+            self._max_weights = {token: max(weights.values()) for token, weights in postings.items()}
+            return
+        positions: List[int] = []
+        values: List[float] = []
+        for token, weights in postings.items():
+            start = len(positions)
+            positions.extend(weights.keys())
+            values.extend(weights.values())
+            self._spans[token] = (start, len(positions))
+        self._positions = np.array(positions, dtype=np.intp)
+        self._weights = np.array(values, dtype=np.float64)
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[Any, float]]:
+        """
+        クエリに関連するツールをスコア順に検索
+
+        Args:
+            query (str): 検索クエリ（ユーザー入力など）
+            top_k (int): 返す最大件数
+
+        Returns:
+            List[Tuple[Any, float]]: (ツール定義, BM25スコア) のリスト
+        """
+        terms = tuple(sorted(set(tokenize(query))))
+        key = (terms, top_k)
+        with self._lock:
+            hits = self._cache.get(key)
+            if hits is not None:
+                self._cache.move_to_end(key)
+        if hits is None:
+            hits = self._score(terms, top_k)
+            with self._lock:
+                self._cache[key] = hits
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return [(self.tools[position], score) for position, score in hits]
+
+    def _score(self, terms: Sequence[str], top_k: int) -> List[Tuple[int, float]]:
+        """上位k件の (ツール番号, スコア) を求める"""
+        if self._positions is not None:
+            return self._score_arrays(terms, top_k)
+        return self._score_maxscore(terms, top_k)
+
+    def _score_arrays(self, terms: Sequence[str], top_k: int) -> List[Tuple[int, float]]:
+        """全語のポスティングをbincountで一括集計する（numpy使用時）"""
+        spans = [self._spans[term] for term in terms if term in self._spans]
+        if not spans or top_k <= 0:
+            return []
+        positions = np.concatenate([self._positions[start:end] for start, end in spans])
+        weights = np.concatenate([self._weights[start:end] for start, end in spans])
+        scores = np.bincount(positions, weights=weights, minlength=len(self.tools))
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(scores[candidates], -top_k)[-top_k:]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(position), float(scores[position])) for position in ranked]
+
+    def _score_maxscore(self, terms: Sequence[str], top_k: int) -> List[Tuple[int, float]]:
+        """
+        MaxScore方式で集計する（numpyがない場合）
+
+        重みの上限が大きい語から順に加算し、残りの語の上限合計が現時点のk位スコアを
+        下回った時点で新規候補の追加をやめ、既存候補の加点だけを行います。
+        """
+        terms = sorted(
+            (term for term in terms if term in self._postings),
+            key=lambda term: self._max_weights[term],
+            reverse=True
+        )
+        total = remaining = sum(self._max_weights[term] for term in terms)
+        scores: Dict[int, float] = {}
+        get = scores.get
+        essential = True
+        for term in terms:
+            weights = self._postings[term]
+            # k位スコアは処理済みの語の上限合計を超えないため、それ未満でなければ閾値計算を省く
+            if essential and len(scores) >= top_k and remaining < total - remaining:
+                threshold = heapq.nlargest(top_k, scores.values())[-1]
+                essential = remaining >= threshold
+            if essential:
+                for position, weight in weights.items():
+                    scores[position] = get(position, 0.0) + weight
+            elif len(scores) < len(weights):
+                lookup = weights.get
+                for position in scores:
+                    scores[position] += lookup(position, 0.0)
+            else:
+                for position, weight in weights.items():
+                    if position in scores:
+                        scores[position] += weight
+            remaining -= self._max_weights[term]
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def select(
+        self,
+        query: Optional[str],
+        top_k: int = 10,
+        pinned: Iterable[str] = ()
+    ) -> List[Any]:
+        """
+        描画対象のツールを選択
+
+        固定ツール（pinned引数で指定された名前、または定義に pinned: true を持つツール）を
+        カタログ順で先頭に置き、その後にクエリとの関連度上位k件を続けます。
+        クエリが空の場合はカタログ全体を返します。
+
+        Args:
+            query (Optional[str]): 検索クエリ
+            top_k (int): 関連度で選ぶ最大件数（固定ツールは含まない）
+            pinned (Iterable[str]): 常に含めるツール名
+
+        Returns:
+            List[Any]: 選択されたツール定義のリスト
+        """
+        if not query:
+            return list(self.tools)
+        pinned_names = set(pinned)
+        selected = [
+            tool for tool in self.tools
+            if _field(tool, "name") in pinned_names or _field(tool, "pinned", False)
+        ]
+        pinned_count = len(selected)
+        seen = {id(tool) for tool in selected}
+        for tool, _ in self.search(query, top_k + pinned_count):
+            if len(selected) - pinned_count >= top_k:
+                break
+            if id(tool) not in seen:
+                selected.append(tool)
+                seen.add(id(tool))
+        return selected
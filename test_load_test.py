@@ -0,0 +1,188 @@
+"""
+負荷試験ハーネス（load_test）のテストスイート
+
+このモジュールは、load_testの以下の動作をテストします：
+1. ランプアップのプロファイルごとの目標ユーザー数
+2. レイテンシーの集計と同時実行数ごとの集計
+3. ベースラインとの比較（悪化の判定、ベースラインが0の場合、設定の違いの警告）
+4. フェイクLLMに対する短い負荷試験のレポートの構成
+"""
+
+from argparse import Namespace
+import json
+import unittest
+from load_test import LoadTest, compare_reports, concurrency_levels, latency_summary, target_users
+
+def make_args(**overrides):
+    """load_test.main() のコマンドライン引数と同じ構造の引数を作成"""
+    args = {
+        'users': 10, 'profile': 'linear', 'ramp': 10.0, 'steps': 5, 'duration': 60.0,
+        'scenario': 'generate', 'think_time': 0.0, 'llm_latency': 0.01, 'llm_sigma': 0.1,
+        'llm_error_rate': 0.0, 'stream': False, 'sample_interval': 0.2, 'drain_timeout': 5.0,
+        'seed': 0, 'output': None, 'compare': None
+    }
+    args.update(overrides)
+    return Namespace(**args)
+
+def make_record(latency, users=1, users_at_end=None, operation='generate', error=None):
+    """1件のリクエストの記録を作成"""
+    return {
+        'operation': operation, 'start': 0.0, 'end': latency, 'latency': latency,
+        'users': users, 'users_at_end': users if users_at_end is None else users_at_end, 'error': error
+    }
+
+def make_report(throughput=10.0, p95=1.0, error_rate=0.0, rss_growth_mb=5.0, **config):
+    """比較に使う項目だけを持つレポートを作成"""
+    operation = {'throughput': throughput, 'p50': 0.5, 'p95': p95, 'p99': p95}
+    return {
+        'meta': {'config': {'users': 10, 'profile': 'linear', **config}},
+        'summary': {
+            'throughput': throughput, 'error_rate': error_rate, 'p50': 0.5, 'p95': p95, 'p99': p95,
+            'operations': {'generate': operation},
+            'rss_growth_mb': rss_growth_mb, 'threads_peak': 12, 'connections_peak': None
+        }
+    }
+
+def change_of(table, metric):
+    """比較表から指標の変化の列を取り出す"""
+    for line in table.splitlines():
+        if line.split()[0] == metric:
+            return line[48:].strip()
+    raise AssertionError(f"{metric} is not in the table")
+
+class TestLoadTest(unittest.TestCase):
+    """load_testのテストケース集"""
+
+    def test_target_users(self):
+        """
+        ランプアップのテスト
+
+        constantは最初から全員、linearは経過時間に比例して、stepは段階ごとに増え、
+        ランプアップの後と ramp=0 では全員になることを検証します。
+        """
+        self.assertEqual(target_users('constant', 0.0, 10, 10.0), 10)
+
+        self.assertEqual(target_users('linear', 0.0, 10, 10.0), 1)
+        self.assertEqual(target_users('linear', 2.5, 10, 10.0), 3)
+        self.assertEqual(target_users('linear', 5.0, 10, 10.0), 5)
+        self.assertEqual(target_users('linear', 10.0, 10, 10.0), 10)
+        self.assertEqual(target_users('linear', 30.0, 10, 10.0), 10)
+
+        self.assertEqual(target_users('step', 0.0, 10, 10.0, steps=5), 2)
+        self.assertEqual(target_users('step', 1.99, 10, 10.0, steps=5), 2)
+        self.assertEqual(target_users('step', 2.0, 10, 10.0, steps=5), 4)
+        self.assertEqual(target_users('step', 9.99, 10, 10.0, steps=5), 10)
+        self.assertEqual(target_users('step', 0.0, 3, 10.0, steps=5), 1)
+
+        for profile in ('linear', 'step'):
+            self.assertEqual(target_users(profile, 0.0, 10, 0.0), 10)
+        with self.assertRaises(ValueError):
+            target_users('burst', 1.0, 10, 10.0)
+
+    def test_latency_summary(self):
+        """
+        レイテンシー集計のテスト
+
+        エラーのリクエストはレイテンシーとスループットから除かれ、エラー率に数えられることと、
+        記録や時間がない場合に0を返すことを検証します。
+        """
+        records = [make_record(latency / 100) for latency in range(1, 101)]
+        records.append(make_record(5.0, error='TimeoutError'))
+        summary = latency_summary(records, 10.0)
+
+        self.assertEqual((summary['count'], summary['errors']), (101, 1))
+        self.assertEqual(summary['error_rate'], round(1 / 101, 4))
+        self.assertEqual(summary['throughput'], 10.0)
+        self.assertEqual((summary['p50'], summary['p95'], summary['p99'], summary['max']), (0.5, 0.95, 0.99, 1.0))
+
+        empty = latency_summary([], 0.0)
+        self.assertEqual((empty['count'], empty['error_rate'], empty['throughput'], empty['p95'], empty['max']), (0, 0.0, 0.0, 0.0, 0.0))
+
+    def test_concurrency_levels(self):
+        """
+        同時実行数ごとの集計のテスト
+
+        開始時のユーザー数で最大10段階にまとめ、スループットは完了時の段階に滞在した時間で割り、
+        滞在時間が短すぎる段階はNoneになることを検証します。
+        """
+        args = make_args(users=20)
+        records = [
+            make_record(0.1, users=1, users_at_end=1),
+            make_record(0.2, users=2, users_at_end=3),
+            make_record(0.3, users=3, users_at_end=4),
+            make_record(0.4, users=19, users_at_end=20),
+            make_record(0.5, users=20, users_at_end=20, error='RuntimeError')
+        ]
+        levels = concurrency_levels(args, records, {1: 1.0, 2: 1.0, 3: 0.01, 19: 0.5, 20: 1.5})
+
+        self.assertEqual([level['users'] for level in levels], [2, 4, 20])
+        by_users = {level['users']: level for level in levels}
+        self.assertEqual((by_users[2]['count'], by_users[2]['seconds'], by_users[2]['throughput']), (2, 2.0, 0.5))
+        self.assertEqual((by_users[4]['count'], by_users[4]['seconds'], by_users[4]['throughput']), (1, 0.01, None))
+        self.assertEqual((by_users[20]['count'], by_users[20]['errors'], by_users[20]['throughput']), (2, 1, 0.5))
+
+    def test_compare_reports(self):
+        """
+        比較のテスト
+
+        10%以上悪化した指標だけに印が付き、ベースラインが0の指標は変化なしか new になり、
+        設定が異なる場合は警告が表示されることを検証します。
+        """
+        table = compare_reports(
+            make_report(throughput=8.0, p95=1.05, error_rate=0.02, rss_growth_mb=4.0),
+            make_report(throughput=10.0, p95=1.0, error_rate=0.0, rss_growth_mb=5.0)
+        )
+        self.assertTrue(table.splitlines()[0].startswith('metric'))
+        self.assertEqual(change_of(table, 'throughput'), '-20.0% !')
+        self.assertEqual(change_of(table, 'generate.throughput'), '-20.0% !')
+        self.assertEqual(change_of(table, 'p95'), '+5.0%')
+        self.assertEqual(change_of(table, 'rss_growth_mb'), '-20.0%')
+        self.assertEqual(change_of(table, 'error_rate'), 'new')
+        self.assertEqual(change_of(table, 'threads_peak'), '+0.0%')
+        self.assertEqual(change_of(table, 'connections_peak'), '')
+
+        unchanged = compare_reports(make_report(error_rate=0.0), make_report(error_rate=0.0))
+        self.assertEqual(change_of(unchanged, 'error_rate'), '')
+        self.assertNotIn('!', unchanged)
+
+        warned = compare_reports(make_report(users=50, stream=True), make_report())
+        self.assertEqual(warned.splitlines()[0], "⚠️ Config differs from baseline: stream, users")
+
+    def test_run_report_layout(self):
+        """
+        負荷試験の実行のテスト
+
+        フェイクLLMに対する短い実行で、レポートが固定の構成を持ち、JSONに変換でき、
+        自分自身と比較しても悪化が報告されないことを検証します。
+        """
+        args = make_args(users=2, profile='constant', ramp=0.0, duration=1.0)
+        report = LoadTest(args).run()
+
+        self.assertEqual(list(report), ['meta', 'summary', 'by_users', 'samples'])
+        self.assertEqual(
+            list(report['meta']),
+            ['started_at', 'git_commit', 'python', 'platform', 'cpu_count', 'config']
+        )
+        self.assertNotIn('output', report['meta']['config'])
+        self.assertNotIn('compare', report['meta']['config'])
+        self.assertEqual(list(report['meta']['config']), sorted(report['meta']['config']))
+
+        summary = report['summary']
+        self.assertEqual(list(summary), [
+            'duration', 'count', 'errors', 'error_rate', 'throughput', 'p50', 'p95', 'p99', 'max',
+            'operations', 'rss_start_mb', 'rss_end_mb', 'rss_peak_mb', 'rss_growth_mb',
+            'threads_start', 'threads_peak', 'connections_start', 'connections_peak'
+        ])
+        self.assertEqual(list(summary['operations']), ['generate'])
+        self.assertGreater(summary['count'], 0)
+        self.assertEqual(summary['errors'], 0)
+        self.assertEqual(report['by_users'][-1]['users'], 2)
+        self.assertTrue({level['users'] for level in report['by_users']} <= {1, 2})
+        self.assertTrue(all(list(sample)[:3] == ['t', 'users', 'completed'] for sample in report['samples']))
+
+        restored = json.loads(json.dumps(report, ensure_ascii=False))
+        self.assertEqual(restored, report)
+        self.assertNotIn('!', compare_reports(restored, report))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+一括レンダリング（render_farm）のテストスイート
+
+このモジュールは、render_farmの以下の動作をテストします：
+1. パラメータ行列の展開とジョブIDの一意性
+2. シャード分割された出力先パス
+3. マニフェストの内容と、入力が変わっていないジョブのスキップ
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from render_farm import MANIFEST_NAME, expand_matrix, render_matrix, shard_path
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(ROOT, "config", "hayashi_agent_config.yaml")
+TEMPLATES_PATH = os.path.join(ROOT, "templates")
+
+class TestRenderFarm(unittest.TestCase):
+    """render_farmのテストケース集"""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.work_dir, "rendered")
+        self.config_paths = []
+        for name in ("team_a", "team_b"):
+            os.makedirs(os.path.join(self.work_dir, name))
+            path = os.path.join(self.work_dir, name, "agent.yaml")
+            shutil.copy(CONFIG_PATH, path)
+            self.config_paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_expand_matrix_ids_are_unique(self):
+        """
+        行列展開のテスト
+
+        すべての組み合わせが展開され、非ASCIIの値や同じファイル名の設定でもジョブIDが
+        重複せず、ファイル名として安全であることを検証します。
+        """
+        jobs = expand_matrix({
+            "configs": self.config_paths,
+            "languages": ["日本語", "中文"],
+            "security_levels": ["high", "medium"]
+        })
+
+        self.assertEqual(len(jobs), 2 * 3 * 2 * 2)
+        self.assertEqual(len({job["job_id"] for job in jobs}), len(jobs))
+        for job in jobs:
+            self.assertRegex(job["job_id"], r"^[A-Za-z0-9_.-]+$")
+            self.assertTrue(job["job_id"].startswith(f"agent-{job['mode']}-"))
+        self.assertEqual([job["job_id"] for job in expand_matrix({"configs": self.config_paths})],
+                         [job["job_id"] for job in expand_matrix({"configs": self.config_paths})])
+
+    def test_shard_path(self):
+        """
+        シャード分割のテスト
+
+        出力先がジョブIDのハッシュの先頭2桁のディレクトリになることを検証します。
+        """
+        path = shard_path(self.output_dir, "agent-code-Japanese-high-development-0123456789ab")
+        shard = os.path.basename(os.path.dirname(path))
+
+        self.assertRegex(shard, r"^[0-9a-f]{2}$")
+        self.assertEqual(os.path.dirname(os.path.dirname(path)), self.output_dir)
+        self.assertEqual(os.path.basename(path), "agent-code-Japanese-high-development-0123456789ab.md")
+
+    def test_manifest_and_skip_unchanged(self):
+        """
+        マニフェストとスキップのテスト
+
+        マニフェストに各出力のパスと内容のハッシュが記録され、2回目は入力が変わった
+        ジョブだけが再レンダリングされることを検証します。
+        """
+        matrix = {"configs": self.config_paths, "modes": ["architect", "code"], "languages": ["日本語", "中文"]}
+        summary = render_matrix(matrix, self.output_dir, TEMPLATES_PATH, workers=1)
+        self.assertEqual((summary["total"], summary["rendered"], summary["skipped"]), (8, 8, 0))
+
+        with open(os.path.join(self.output_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.assertEqual(len(manifest["entries"]), 8)
+        for job_id, entry in manifest["entries"].items():
+            path = os.path.join(self.output_dir, entry["path"])
+            self.assertEqual(path, shard_path(self.output_dir, job_id))
+            self.assertEqual(hashlib.sha256(Path(path).read_bytes()).hexdigest(), entry["content_hash"])
+
+        summary = render_matrix(matrix, self.output_dir, TEMPLATES_PATH, workers=1)
+        self.assertEqual((summary["rendered"], summary["skipped"]), (0, 8))
+
+        with open(self.config_paths[1], "a", encoding="utf-8") as f:
+            f.write("\n# changed\n")
+        summary = render_matrix(matrix, self.output_dir, TEMPLATES_PATH, workers=1)
+        self.assertEqual((summary["rendered"], summary["skipped"]), (4, 4))
+
+if __name__ == '__main__':
+    unittest.main()